@@ -0,0 +1,101 @@
+"""Report of the memory allocated in each phase of a frame, run without a browser.
+A scenario of the benchmarks is played for some frames so every object it needs is created,
+then the objects created in the next profiler.ROLLING_SAMPLES frames are traced:
+
+    python allocations.py             level01, Mario running through the level
+    python allocations.py goombas     any scenario of benchmark.py
+
+Kept objects are the ones created in a phase that are still alive when it ends (numbers and
+strings are not counted). Allocated bytes are the most bytes allocated at the same time during
+the phase, so they also count the temporary objects and numbers that are deleted before it ends.
+A phase that doesn't create anything allocates 0 bytes, but a loop or a float result allocates
+a few dozen. The lines and types with the most kept objects are listed at the end.
+"""
+import linecache
+import sys
+
+if __name__ == "__main__":
+    # outside the browser the game runs with the headless version of pyxel
+    import pyxel_headless
+    pyxel_headless.install()
+
+import pyxel
+import profiler
+from benchmark import SCENARIOS, Scenario
+
+# frames played before tracing, so the objects that are created once are not counted
+WARM_UP_FRAMES = 60
+# lines listed in the report
+REPORT_LINES = 15
+
+
+def _play(scenario: Scenario, level, frame: int):
+    pyxel.set_keys(scenario.keys(frame))
+    pyxel.update()
+    if scenario.events is not None:
+        scenario.events(level, frame)
+    level.update()
+    level.draw()
+    pyxel.flush()
+
+
+def trace(scenario: Scenario) -> dict:
+    # plays the scenario and returns the phases of the profiler with their allocations
+    pyxel.frame_count = 0
+    level = scenario.create_level()
+    for frame in range(WARM_UP_FRAMES):
+        _play(scenario, level, frame)
+
+    if not profiler.enabled:
+        profiler.toggle()
+    profiler.track_allocations()
+    for frame in range(WARM_UP_FRAMES, WARM_UP_FRAMES + profiler.ROLLING_SAMPLES):
+        _play(scenario, level, frame)
+    profiler.track_allocations(False)
+    profiler.toggle()
+    return profiler.phases()
+
+
+def report(scenario: Scenario) -> str:
+    phases = trace(scenario)
+    lines = ["%s: %d frames after %d frames of warm up" % (scenario.name, profiler.ROLLING_SAMPLES, WARM_UP_FRAMES),
+             "%-12s %11s %10s %12s %13s %10s" % ("phase", "kept/frame", "max kept", "frames with",
+                                                 "bytes/frame", "max bytes")]
+    total = total_bytes = 0
+    for name, stats in phases.items():
+        objects = sum(stats.objects)
+        allocated_bytes = sum(stats.allocated_bytes)
+        total += objects
+        total_bytes += allocated_bytes
+        frames_with_objects = len([count for count in stats.objects if count > 0])
+        lines.append("%-12s %11.1f %10d %12d %13.0f %10d" % (
+            name, objects / stats.samples, max(stats.objects), frames_with_objects,
+            allocated_bytes / stats.samples, max(stats.allocated_bytes)))
+    lines.append("%-12s %11.1f %10s %12s %13.0f" % ("total", total / profiler.ROLLING_SAMPLES, "", "",
+                                                     total_bytes / profiler.ROLLING_SAMPLES))
+
+    if profiler.allocation_lines:
+        lines.append("")
+        lines.append("%8s  %s" % ("objects", "line"))
+        top = sorted(profiler.allocation_lines.items(), key=lambda item: item[1], reverse=True)
+        for line, count in top[:REPORT_LINES]:
+            if ".py:" not in line:
+                lines.append("%8d  %s" % (count, line))
+                continue
+            filename, lineno = line.rsplit(":", 1)
+            source = linecache.getline(filename, int(lineno)).strip()
+            lines.append("%8d  %s  %s" % (count, line, source))
+        lines.append("")
+        lines.append("%8s  %s" % ("objects", "type"))
+        top = sorted(profiler.allocation_types.items(), key=lambda item: item[1], reverse=True)
+        for name, count in top[:REPORT_LINES]:
+            lines.append("%8d  %s" % (count, name))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or ["level01"]
+    for scenario in SCENARIOS:
+        if scenario.name in names:
+            print(report(scenario))
+            print()
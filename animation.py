@@ -1,3 +1,4 @@
+import math
 import pyxel
 
 
@@ -29,6 +30,11 @@ class Image:
         else:
             height = self._height
 
+        # sprites keep their exact position, but they are drawn on whole pixels
+        # so the canvas doesn't have to filter them
+        x = math.floor(x)
+        y = math.floor(y)
+
         # draw image
         pyxel.blt(x, y, self._image_bank, self._x, self._y, width, height, self._transparent_col)
 
@@ -0,0 +1,242 @@
+"""Benchmarks of the frame time of the game, run without a browser with the headless version of pyxel.
+Every scenario creates a level and plays it with scripted inputs, measuring each Level.update
+and Level.draw. Results are times per frame in microseconds (mean, 95th and 99th percentile),
+the number of images drawn (blits) per frame and the number of commands sent to the canvas per frame,
+which also counts clearing the screen and changing the layer:
+
+    python benchmark.py                      runs every scenario
+    python benchmark.py goombas level01      runs the given scenarios
+    python benchmark.py --json results.json  also saves the results, to compare them over time
+    python benchmark.py --frames 300         changes the number of frames of every scenario
+"""
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+
+if __name__ == "__main__":
+    # outside the browser the game runs with the headless version of pyxel
+    import pyxel_headless
+    pyxel_headless.install()
+
+import pyxel
+import settings
+from enemies import Goomba, KoopaTroopa
+from level import Level
+from level_tiles import Block
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT, TILE_SIZE
+
+SEED = 1
+
+
+def _run_and_jump(frame: int) -> set:
+    # runs to the right, jumping often enough to get over the pipes of level01
+    if frame % 23 < 6:
+        return {pyxel.KEY_RIGHT, pyxel.KEY_UP}
+    return {pyxel.KEY_RIGHT}
+
+
+def _walk(frame: int) -> set:
+    return {pyxel.KEY_RIGHT}
+
+
+def _stand(frame: int) -> set:
+    return set()
+
+
+def _keep_alive(level: Level):
+    # Mario can't be hit, so the scenario is not interrupted by deaths
+    level.player.invulnerable = True
+    level.player.invulnerable_count = 0
+
+
+def _generated_level(columns: int, block_rows: tuple = (), wall_every: int = 0) -> tuple:
+    '''
+    Creates a flat level with two rows of floor
+    @param block_rows: rows filled with breakable blocks
+    @param wall_every: columns between walls of breakable blocks two tiles high, 0 for none
+    '''
+    rows = []
+    for row in range(13):
+        if row >= 11:
+            rows.append('F' * columns)
+        elif row in block_rows:
+            rows.append(' ' * 16 + 'B' * (columns - 16))
+        elif wall_every > 0 and row >= 9:
+            rows.append(''.join('B' if col > 16 and col % wall_every == 0 else ' ' for col in range(columns)))
+        else:
+            rows.append(' ' * columns)
+    # Mario starts at the beginning
+    rows[10] = rows[10][:9] + 'P' + rows[10][10:]
+    return tuple(rows)
+
+
+def _repeated_level(columns: int) -> tuple:
+    # level01 repeated until it has the given columns, the end (castle) is kept once
+    body = len(settings.level01[0]) - 30
+    times = math.ceil((columns - 30) / body)
+    rows = tuple(row[:-30] * times + row[-30:] for row in settings.level01)
+    # only one player start
+    return tuple(row.replace('P', ' ') if index > 0 else row for index, row in enumerate(rows))
+
+
+class Scenario:
+    """A level played with scripted inputs, events are added to the level in every frame by the scenario"""
+
+    def __init__(self, name: str, description: str, create_level, keys, frames: int, events=None):
+        '''
+        @param create_level: function that returns the level to play
+        @param keys: function that receives the frame and returns the pressed keys
+        @param events: function called before every update with the level and the frame
+        '''
+        self.name = name
+        self.description = description
+        self.create_level = create_level
+        self.keys = keys
+        self.frames = frames
+        self.events = events
+
+
+def _goombas(level: Level, frame: int):
+    _keep_alive(level)
+    # enemies far from Mario are deleted, new ones keep the number of goombas
+    while len(level.enemies) < 200:
+        x = level.player.x - SCREEN_WIDTH + (len(level.enemies) * 37) % (SCREEN_WIDTH * 3)
+        level.enemies.append(Goomba(x, 0))
+
+
+def _shells(level: Level, frame: int):
+    _keep_alive(level)
+    # a moving shell appears every second in front of Mario
+    if frame % settings.FPS == 0 and len(level.enemies) < 30:
+        shell = KoopaTroopa(level.player.x + 2 * TILE_SIZE, 9 * TILE_SIZE + 8)
+        # the first hit hides the koopa in its shell, the second one kicks the shell to the right
+        shell.hit()
+        shell.hit(1)
+        level.enemies.append(shell)
+
+
+def _destroy_blocks(level: Level, frame: int):
+    _keep_alive(level)
+    # destroys every block on screen twice a second. The particles of each block are deleted
+    # when they fall off the screen, so the scenario measures a steady number of them
+    if frame % (settings.FPS // 2) == 0:
+        left = -level.camera.x_shift
+        for tile in level.tile_map.query_area(left, 0, left + SCREEN_WIDTH, SCREEN_HEIGHT):
+            if isinstance(tile, Block) and tile.breakable and not tile.broken:
+                tile.destroy()
+
+
+SCENARIOS = (
+    Scenario("level01", "Mario runs and jumps through level01 until the castle",
+             lambda: Level(settings.level01, seed=SEED), _run_and_jump, 1200),
+    Scenario("goombas", "200 goombas walking around Mario at the same time",
+             lambda: Level(settings.level01, seed=SEED), _stand, 600, _goombas),
+    Scenario("shells", "koopa shells breaking walls of blocks in front of Mario",
+             lambda: Level(_generated_level(400, wall_every=8), seed=SEED), _walk, 900, _shells),
+    Scenario("particles", "every block on screen is destroyed twice a second, under rows of blocks",
+             lambda: Level(_generated_level(400, block_rows=(2, 3, 4, 5, 6)), seed=SEED), _walk, 900, _destroy_blocks),
+    Scenario("streaming", "a generated level of 20000 columns, streamed around the camera",
+             lambda: Level(_repeated_level(20000), streaming=True, seed=SEED), _run_and_jump, 1500),
+)
+
+
+def percentile(values: list, percent: float) -> float:
+    # nearest rank percentile of a sorted list
+    if len(values) == 0:
+        return 0
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def summary(times: list) -> dict:
+    # times in nanoseconds, the summary in microseconds
+    times = sorted(times)
+    return {
+        "mean": round(sum(times) / len(times) / 1000, 2),
+        "p95": round(percentile(times, 95) / 1000, 2),
+        "p99": round(percentile(times, 99) / 1000, 2),
+        "max": round(times[-1] / 1000, 2),
+    }
+
+
+def run(scenario: Scenario, frames: int = None) -> dict:
+    if frames is None:
+        frames = scenario.frames
+    # the level is created as in the game, before the first update
+    pyxel.frame_count = 0
+    start = time.perf_counter_ns()
+    level = scenario.create_level()
+    setup = time.perf_counter_ns() - start
+
+    update_times = []
+    draw_times = []
+    blits = []
+    commands = []
+    for frame in range(frames):
+        pyxel.set_keys(scenario.keys(frame))
+        pyxel.update()
+        if scenario.events is not None:
+            scenario.events(level, frame)
+
+        start = time.perf_counter_ns()
+        level.update()
+        update_times.append(time.perf_counter_ns() - start)
+
+        start = time.perf_counter_ns()
+        blit_count = pyxel.blit_count
+        level.draw()
+        pyxel.flush()
+        draw_times.append(time.perf_counter_ns() - start)
+        blits.append(pyxel.blit_count - blit_count)
+        commands.append(pyxel.command_count)
+
+    return {
+        "description": scenario.description,
+        "frames": frames,
+        "setup_ms": round(setup / 1e6, 2),
+        "update_us": summary(update_times),
+        "draw_us": summary(draw_times),
+        "frame_us": summary([update_times[i] + draw_times[i] for i in range(frames)]),
+        "blits": {"mean": round(sum(blits) / frames, 1), "max": max(blits)},
+        "commands": {"mean": round(sum(commands) / frames, 1), "max": max(commands)},
+    }
+
+
+def main(arguments: list):
+    parser = argparse.ArgumentParser(description="Benchmarks of the frame time of the game")
+    # the default is checked against the choices too, so "all" is one of them
+    parser.add_argument("scenarios", nargs="*", default="all", choices=["all"] + [scenario.name for scenario in SCENARIOS],
+                        help="scenarios to run, all of them by default")
+    parser.add_argument("--json", metavar="FILE", help="also saves the results in the given file")
+    parser.add_argument("--frames", type=int, help="number of frames of every scenario")
+    options = parser.parse_args(arguments)
+    json_file = options.json
+    frames = options.frames
+    # a list of names, or the default "all" when none is given
+    scenarios = [scenario for scenario in SCENARIOS if "all" in options.scenarios or scenario.name in options.scenarios]
+
+    results = {}
+    print("%-10s %27s %27s %9s %9s" % ("", "update us (mean/p95/p99)", "draw us (mean/p95/p99)", "blits", "commands"))
+    for scenario in scenarios:
+        result = run(scenario, frames)
+        results[scenario.name] = result
+        update = result["update_us"]
+        draw = result["draw_us"]
+        print("%-10s %9.1f %8.1f %8.1f %9.1f %8.1f %8.1f %9.1f %9.1f" % (
+            scenario.name, update["mean"], update["p95"], update["p99"],
+            draw["mean"], draw["p95"], draw["p99"], result["blits"]["mean"], result["commands"]["mean"]))
+
+    if json_file is not None:
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_implementation() + " " + platform.python_version(),
+            "scenarios": results,
+        }
+        with open(json_file, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,138 @@
+from settings import BROAD_PHASE_MARGIN
+from sprite import Sprite
+
+# neighbours of the enemies that are not in the broad phase
+_NO_NEIGHBOURS = ()
+
+
+class BroadPhase:
+    """Finds which entities are close enough to collide using sweep and prune:
+    Mario, enemies and items are kept sorted by their left coordinate, so only the
+    entities whose horizontal ranges overlap are paired. The narrow phase (intersects)
+    is still done by the entities themselves.
+
+    The broad phase is computed once at the beginning of the frame, so every range is
+    extended by a margin that covers what entities move during the frame.
+    Its lists, sets and dictionaries are emptied and filled again every frame instead of
+    being created again, so a frame doesn't create new objects
+    """
+
+    def __init__(self, margin: int = BROAD_PHASE_MARGIN):
+        self._margin = margin
+        # every entity of the level, sorted by their left coordinate
+        self._bodies = []
+        # enemies that can collide with Mario
+        self.player_enemies = []
+        # items that can collide with Mario
+        self.player_items = []
+        # dictionary with an enemy as key and the list of enemies that can collide with it as value
+        self._enemy_neighbours = {}
+        # position of every enemy and item in the level lists
+        self._order = {}
+        self._enemies = set()
+        # bodies that are still in the level
+        self._known = set()
+        # bodies whose extended range may still overlap the next ones during the sweep
+        self._active = []
+
+    def update(self, player: Sprite, enemies: list, items: list):
+        # position of every enemy and item in the level lists, so candidates are checked in the same order
+        order = self._order
+        order.clear()
+        for i in range(len(enemies)):
+            order[enemies[i]] = i
+        for i in range(len(items)):
+            order[items[i]] = i
+
+        # the list is updated instead of being rebuilt: entities that are no longer in the level are
+        # removed, and new ones are added at the end before sorting
+        bodies = self._bodies
+        known = self._known
+        known.clear()
+        count = 0
+        for body in bodies:
+            if body is player or body in order:
+                bodies[count] = body
+                count += 1
+                known.add(body)
+        del bodies[count:]
+        if player not in known:
+            bodies.append(player)
+        for body in enemies:
+            if body not in known:
+                bodies.append(body)
+        for body in items:
+            if body not in known:
+                bodies.append(body)
+        self.__sort(bodies)
+        known.clear()
+
+        self.player_enemies.clear()
+        self.player_items.clear()
+        self._enemies.clear()
+        self._enemies.update(enemies)
+        self.__clear_neighbours()
+        self.__sweep(player, self._enemies)
+
+        self.player_enemies.sort(key=order.get)
+        self.player_items.sort(key=order.get)
+        for neighbours in self._enemy_neighbours.values():
+            neighbours.sort(key=order.get)
+
+    def __clear_neighbours(self):
+        # the lists of the enemies that are still in the level are kept for this frame
+        if len(self._enemy_neighbours) > len(self._enemies):
+            for enemy in [enemy for enemy in self._enemy_neighbours if enemy not in self._enemies]:
+                del self._enemy_neighbours[enemy]
+        for neighbours in self._enemy_neighbours.values():
+            neighbours.clear()
+
+    @staticmethod
+    def __sort(bodies: list):
+        # insertion sort, entities barely move between frames so the list is almost sorted
+        for i in range(1, len(bodies)):
+            body = bodies[i]
+            j = i - 1
+            while j >= 0 and bodies[j].left > body.left:
+                bodies[j + 1] = bodies[j]
+                j -= 1
+            bodies[j + 1] = body
+
+    def __sweep(self, player: Sprite, enemies: set):
+        # entities whose extended range may still overlap the next ones
+        active = self._active
+        for body in self._bodies:
+            left = body.left - self._margin
+            # the ones that end before this body starts are removed, keeping the order
+            count = 0
+            for other in active:
+                if other.right + self._margin > left:
+                    active[count] = other
+                    count += 1
+            del active[count:]
+            for other in active:
+                self.__add_pair(body, other, player, enemies)
+            active.append(body)
+        active.clear()
+
+    def __add_pair(self, body: Sprite, other: Sprite, player: Sprite, enemies: set):
+        if body is player or other is player:
+            partner = other if body is player else body
+            if partner in enemies:
+                self.player_enemies.append(partner)
+            else:
+                self.player_items.append(partner)
+        elif body in enemies and other in enemies:
+            self.__neighbours(body).append(other)
+            self.__neighbours(other).append(body)
+
+    def __neighbours(self, enemy: Sprite) -> list:
+        neighbours = self._enemy_neighbours.get(enemy)
+        if neighbours is None:
+            neighbours = []
+            self._enemy_neighbours[enemy] = neighbours
+        return neighbours
+
+    def enemies_near(self, enemy: Sprite) -> list:
+        # enemies added after the last update have no neighbours yet
+        return self._enemy_neighbours.get(enemy, _NO_NEIGHBOURS)
@@ -5,6 +5,7 @@ from entity import Entity
 from settings import GRAVITY, MAX_ACCELERATION, FPS
 from settings import SCREEN_HEIGHT
 from level_tiles import Block
+from tile_map import TileMap
 from settings import GOOMBA_SPEED, KOOPA_SPEED, KOOPA_AREA
 
 
@@ -16,8 +17,8 @@ class Enemy(Entity):
         self._speed = speed
         self.animation = Animation()
 
-    def update(self, tiles: list, enemies: list):
-        # enemies list parameter will be required to have collisions between enemies
+    def update(self, tile_map: TileMap, enemies: list):
+        # enemies list parameter has the enemies that can collide with this one, found by the broad phase
         # enemy dies if falls to the void
         if self.y > SCREEN_HEIGHT:
             self._dead = True
@@ -26,12 +27,6 @@ class Enemy(Entity):
         # enemy dies if hit by default
         self._dead = True
 
-    def _check_horizontal_collisions(self, tiles):
-        pass
-
-    def _check_vertical_collisions(self, tiles):
-        pass
-
     @property
     def does_damage(self):
         # returns True if the enemy can damage Mario when he touches it
@@ -57,8 +52,8 @@ class Goomba(Enemy):
         self.animation.set_frames(walk_frames)
         self.animation.set_delay(FPS / 2)
 
-    def update(self, tiles: list, enemies: list):
-        super().update(tiles, enemies)
+    def update(self, tile_map: TileMap, enemies: list):
+        super().update(tile_map, enemies)
         self.animation.update()
         # goomba won't move if dying
         if not self._dead:
@@ -74,36 +69,25 @@ class Goomba(Enemy):
             else:
                 self._vx = self._speed
 
-            # check collisions
-            self.x += self._vx
-            self._check_horizontal_collisions(tiles)
-            self.y += self._vy
-            self._check_vertical_collisions(tiles)
+            # move and check collisions
+            self._move_x(tile_map, self._vx)
+            self._move_y(tile_map, self._vy)
             self._check_other_enemy_collision(enemies)
 
-    def _check_horizontal_collisions(self, tiles: list):
+    def _on_horizontal_collision(self, tile, dx):
         # enemy will change direction when touching a block
-        for tile in tiles:
-            if super().intersects(tile):
-                if self._direction == 0:
-                    self.left = tile.right
-                    self._direction = 1
-                else:
-                    self.right = tile.left
-                    self._direction = 0
+        if dx < 0:
+            self._direction = 1
+        else:
+            self._direction = 0
 
-    def _check_vertical_collisions(self, tiles: list):
-        for tile in tiles:
-            if super().intersects(tile):
-                if self._vy > 0:
-                    self.bottom = tile.top
-                    if isinstance(tile, Block):
-                        # goomba gets killed if block below has been destroyed or block is bouncing
-                        if tile.broken or tile.bouncing:
-                            self.hit()
-                else:
-                    self.top = tile.bottom
-                self._vy = 0
+    def _on_vertical_collision(self, tile, dy):
+        if dy > 0:
+            if isinstance(tile, Block):
+                # goomba gets killed if block below has been destroyed or block is bouncing
+                if tile.broken or tile.bouncing:
+                    self.hit()
+        self._vy = 0
 
     def _check_other_enemy_collision(self, enemies: list):
         for enemy in enemies:
@@ -139,8 +123,8 @@ class KoopaTroopa(Enemy):
         self.animation.set_frames(self._walk_frames)
         self.animation.set_delay(FPS / 2)
 
-    def update(self, tiles: list, enemies: list):
-        super().update(tiles, enemies)
+    def update(self, tile_map: TileMap, enemies: list):
+        super().update(tile_map, enemies)
         self.animation.update()
         # apply gravity
         self._vy += GRAVITY
@@ -174,33 +158,21 @@ class KoopaTroopa(Enemy):
             else:
                 self._vx = 0
 
-        # check collisions
-        self.x += self._vx
-        self._check_horizontal_collisions(tiles)
-        self.y += self._vy
-        self._check_vertical_collisions(tiles)
+        # move and check collisions
+        self._move_x(tile_map, self._vx)
+        self._move_y(tile_map, self._vy)
 
-    def _check_horizontal_collisions(self, tiles: list):
-        for tile in tiles:
-            if super().intersects(tile):
-                if self._direction == 0:
-                    self.left = tile.right
-                    self._direction = 1
-                else:
-                    self.right = tile.left
-                    self._direction = 0
-                if isinstance(tile, Block):
-                    if self._hidden_in_shell and self._shell_moving and tile.breakable:
-                        tile.destroy()
-
-    def _check_vertical_collisions(self, tiles: list):
-        for tile in tiles:
-            if super().intersects(tile):
-                if self._vy > 0:
-                    self.bottom = tile.top
-                else:
-                    self.top = tile.bottom
-                self._vy = 0
+    def _on_horizontal_collision(self, tile, dx):
+        if dx < 0:
+            self._direction = 1
+        else:
+            self._direction = 0
+        if isinstance(tile, Block):
+            if self._hidden_in_shell and self._shell_moving and tile.breakable:
+                tile.destroy()
+
+    def _on_vertical_collision(self, tile, dy):
+        self._vy = 0
 
     def hit(self, direction: int = 0):
         # @param direction 0 is left, 1 is right
@@ -18,12 +18,6 @@ class Entity(Sprite):
         # entity dies if hit by default
         self._dead = True
 
-    def _check_horizontal_collisions(self, tiles: list):
-        pass
-
-    def _check_vertical_collisions(self, tiles):
-        pass
-
     @property
     def dead(self):
         return self._dead
@@ -0,0 +1,111 @@
+"""Bitmap font used by pyxel.text. Every character is a glyph of 3x5 pixels that is drawn
+with a blit from an atlas, so texts look the same in every browser and are as cheap as sprites.
+Lowercase letters are drawn with the uppercase glyphs.
+"""
+
+GLYPH_WIDTH = 3
+GLYPH_HEIGHT = 5
+# horizontal distance between the start of two characters
+CHARACTER_WIDTH = 4
+
+# pixels of every glyph, by rows ('#' is a pixel of the character)
+GLYPHS = {
+    'A': ('.#.', '#.#', '###', '#.#', '#.#'),
+    'B': ('##.', '#.#', '##.', '#.#', '##.'),
+    'C': ('.##', '#..', '#..', '#..', '.##'),
+    'D': ('##.', '#.#', '#.#', '#.#', '##.'),
+    'E': ('###', '#..', '##.', '#..', '###'),
+    'F': ('###', '#..', '##.', '#..', '#..'),
+    'G': ('.##', '#..', '#.#', '#.#', '.##'),
+    'H': ('#.#', '#.#', '###', '#.#', '#.#'),
+    'I': ('###', '.#.', '.#.', '.#.', '###'),
+    'J': ('..#', '..#', '..#', '#.#', '.#.'),
+    'K': ('#.#', '#.#', '##.', '#.#', '#.#'),
+    'L': ('#..', '#..', '#..', '#..', '###'),
+    'M': ('#.#', '###', '###', '#.#', '#.#'),
+    'N': ('##.', '#.#', '#.#', '#.#', '#.#'),
+    'O': ('.#.', '#.#', '#.#', '#.#', '.#.'),
+    'P': ('##.', '#.#', '##.', '#..', '#..'),
+    'Q': ('.#.', '#.#', '#.#', '##.', '.##'),
+    'R': ('##.', '#.#', '##.', '#.#', '#.#'),
+    'S': ('.##', '#..', '.#.', '..#', '##.'),
+    'T': ('###', '.#.', '.#.', '.#.', '.#.'),
+    'U': ('#.#', '#.#', '#.#', '#.#', '.##'),
+    'V': ('#.#', '#.#', '#.#', '.#.', '.#.'),
+    'W': ('#.#', '#.#', '###', '###', '#.#'),
+    'X': ('#.#', '#.#', '.#.', '#.#', '#.#'),
+    'Y': ('#.#', '#.#', '.#.', '.#.', '.#.'),
+    'Z': ('###', '..#', '.#.', '#..', '###'),
+    '0': ('###', '#.#', '#.#', '#.#', '###'),
+    '1': ('.#.', '##.', '.#.', '.#.', '###'),
+    '2': ('##.', '..#', '.#.', '#..', '###'),
+    '3': ('##.', '..#', '.#.', '..#', '##.'),
+    '4': ('#.#', '#.#', '###', '..#', '..#'),
+    '5': ('###', '#..', '##.', '..#', '##.'),
+    '6': ('.##', '#..', '###', '#.#', '###'),
+    '7': ('###', '..#', '.#.', '.#.', '.#.'),
+    '8': ('###', '#.#', '###', '#.#', '###'),
+    '9': ('###', '#.#', '###', '..#', '##.'),
+    ':': ('...', '.#.', '...', '.#.', '...'),
+    '.': ('...', '...', '...', '...', '.#.'),
+    ',': ('...', '...', '...', '.#.', '#..'),
+    "'": ('.#.', '.#.', '...', '...', '...'),
+    '!': ('.#.', '.#.', '.#.', '...', '.#.'),
+    '?': ('##.', '..#', '.#.', '...', '.#.'),
+    '-': ('...', '...', '###', '...', '...'),
+    '+': ('...', '.#.', '###', '.#.', '...'),
+    '/': ('..#', '..#', '.#.', '#..', '#..'),
+}
+
+# the glyphs are placed in the atlas from left to right in this order
+CHARACTERS = ''.join(GLYPHS)
+ATLAS_WIDTH = len(CHARACTERS) * GLYPH_WIDTH
+ATLAS_HEIGHT = GLYPH_HEIGHT
+
+# x coordinate of each glyph in the atlas
+_glyph_x = {}
+for i in range(len(CHARACTERS)):
+    _glyph_x[CHARACTERS[i]] = i * GLYPH_WIDTH
+    _glyph_x[CHARACTERS[i].lower()] = i * GLYPH_WIDTH
+
+# glyph runs of the last texts drawn, texts like the score are drawn every frame
+_runs = {}
+MAX_CACHED_RUNS = 256
+
+
+def glyph_run(text: str) -> tuple:
+    """Returns the glyphs of a text as tuples with the x coordinate of the glyph in the atlas
+    and the x coordinate where it is drawn, relative to the start of the text.
+    Characters without glyph (spaces) are not drawn but still take their place
+    """
+    run = _runs.get(text)
+    if run is None:
+        run = []
+        for i in range(len(text)):
+            glyph_x = _glyph_x.get(text[i])
+            if glyph_x is not None:
+                run.append((glyph_x, i * CHARACTER_WIDTH))
+        run = tuple(run)
+        if len(_runs) >= MAX_CACHED_RUNS:
+            _runs.clear()
+        _runs[text] = run
+    return run
+
+
+def text_width(text: str) -> int:
+    if len(text) == 0:
+        return 0
+    return len(text) * CHARACTER_WIDTH - (CHARACTER_WIDTH - GLYPH_WIDTH)
+
+
+def rasterize(red: int, green: int, blue: int) -> bytes:
+    # pixels of the atlas as RGBA bytes, the glyphs have the given color and the rest is transparent
+    pixels = bytearray(ATLAS_WIDTH * ATLAS_HEIGHT * 4)
+    for i in range(len(CHARACTERS)):
+        rows = GLYPHS[CHARACTERS[i]]
+        for y in range(GLYPH_HEIGHT):
+            for x in range(GLYPH_WIDTH):
+                if rows[y][x] == '#':
+                    index = (y * ATLAS_WIDTH + i * GLYPH_WIDTH + x) * 4
+                    pixels[index:index + 4] = bytes((red, green, blue, 255))
+    return bytes(pixels)
@@ -0,0 +1,108 @@
+import math
+import time
+
+import profile_capture
+from settings import FPS, MAX_FRAME_STEPS, MAX_SKIPPED_DRAWS
+
+
+class GameLoop:
+    """Runs the game at a fixed number of updates per second, independently of how often
+    the browser calls tick (once per display refresh with requestAnimationFrame).
+    The time elapsed between ticks is accumulated and consumed in steps of 1 / FPS seconds,
+    so the game runs several updates in a tick when it is behind, and none when the display
+    refreshes faster than FPS. The game is only drawn if it has been updated.
+
+    In adaptive mode the duration of updates and draws is measured, and when both don't fit
+    in a step some draws are skipped, so the game keeps its speed on slow computers
+    """
+
+    def __init__(self, update, draw, fps: int = FPS, max_steps: int = MAX_FRAME_STEPS,
+                 adaptive: bool = False, clock=time.perf_counter):
+        '''
+        @param update: function that advances the game one step
+        @param draw: function that draws the game
+        @param max_steps: maximum number of updates in a tick, the time beyond that is dropped
+        so the game slows down instead of trying to catch up forever
+        @param adaptive: skips draws when updating and drawing takes longer than a step
+        @param clock: function that returns the current time in seconds, used to measure durations
+        '''
+        self._update = update
+        self._draw = draw
+        # duration of a step in milliseconds
+        self._step = 1000 / fps
+        self._max_steps = max_steps
+        self._accumulator = 0
+        self._last_time = None
+
+        self._adaptive = adaptive
+        self._clock = clock
+        # average durations in milliseconds of an update and a draw
+        self._update_time = 0
+        self._draw_time = 0
+        # the game is drawn once every _draw_interval ticks with updates
+        self._draw_interval = 1
+        self._ticks_since_draw = 0
+
+    @property
+    def skip_ratio(self) -> float:
+        # fraction of the frames that are not drawn, 0 when the computer is fast enough
+        return 1 - 1 / self._draw_interval
+
+    def tick(self, now: float) -> int:
+        # now is the time in milliseconds (the timestamp of requestAnimationFrame), returns the number of updates
+        # whole ticks are measured by the captures of the profiler
+        profile_capture.begin_tick()
+        if self._last_time is None:
+            self._last_time = now
+        self._accumulator += now - self._last_time
+        self._last_time = now
+
+        steps = 0
+        while self._accumulator >= self._step and steps < self._max_steps:
+            self.__timed_update()
+            self._accumulator -= self._step
+            steps += 1
+        if steps == self._max_steps:
+            # too far behind
+            self._accumulator = min(self._accumulator, self._step)
+
+        if steps > 0:
+            self._ticks_since_draw += 1
+            if self._ticks_since_draw >= self._draw_interval:
+                self._ticks_since_draw = 0
+                self.__timed_draw()
+        profile_capture.end_tick(steps)
+        return steps
+
+    def __timed_update(self):
+        if not self._adaptive:
+            self._update()
+            return
+        start = self._clock()
+        self._update()
+        self._update_time = self.__average(self._update_time, (self._clock() - start) * 1000)
+
+    def __timed_draw(self):
+        if not self._adaptive:
+            self._draw()
+            return
+        start = self._clock()
+        self._draw()
+        self._draw_time = self.__average(self._draw_time, (self._clock() - start) * 1000)
+        self.__adapt()
+
+    @staticmethod
+    def __average(average: float, value: float) -> float:
+        # moving average, so a single slow frame doesn't change the interval
+        return average * 0.9 + value * 0.1
+
+    def __adapt(self):
+        # chooses how many ticks share a draw: the time left by the updates
+        # of those ticks must be enough for the draw
+        free_time = self._step - self._update_time
+        if free_time <= 0:
+            interval = MAX_SKIPPED_DRAWS + 1
+        else:
+            interval = math.ceil(self._draw_time / free_time)
+            interval = max(1, min(interval, MAX_SKIPPED_DRAWS + 1))
+        self._draw_interval = interval
@@ -1,5 +1,4 @@
-import pyxel
-
+from animation import Image
 from settings import ITEM_SIZE, GRAVITY
 from sprite import Sprite
 import level_tiles
@@ -17,32 +16,14 @@ class Item(Sprite):
         # so they look lighter
         self._max_accel = 3
 
-    def update(self, tiles: list):
+    def update(self, tile_map):
         self._vy += GRAVITY
         # limit gravity acceleration
         if self._vy > self._max_accel:
             self._vy = self._max_accel
 
-        self.x += self._vx
-        self._check_horizontal_collisions(tiles)
-        self.y += self._vy
-        self._check_vertical_collisions(tiles)
-
-    def _check_horizontal_collisions(self, tiles):
-        for tile in tiles:
-            if self.intersects(tile):
-                if self._vx > 0:
-                    self.right = tile.left
-                else:
-                    self.left = tile.right
-
-    def _check_vertical_collisions(self, tiles):
-        for tile in tiles:
-            if self.intersects(tile):
-                if self._vy > 0:
-                    self.bottom = tile.top
-                else:
-                    self.top = tile.bottom
+        self._move_x(tile_map, self._vx)
+        self._move_y(tile_map, self._vy)
 
     def use(self):
         self._used = True
@@ -64,9 +45,10 @@ class Mushroom(Item):
                 raise ValueError("Value of the 'direction' parameter is not valid")
         else:
             raise TypeError("The type of the parameter 'direction' is not valid")
+        self._image = Image(48, 32, 16, 16, 0)
 
-    def update(self, tiles):
-        super().update(tiles)
+    def update(self, tile_map):
+        super().update(tile_map)
 
         if self._direction == 0:
             self._vx = -self._speed
@@ -74,33 +56,24 @@ class Mushroom(Item):
             self._vx = self._speed
 
     # rewritten so mushroom changes direction when colliding with a tile
-    def _check_horizontal_collisions(self, tiles):
-        for tile in tiles:
-            if self.intersects(tile):
-                if self._direction == 0:
-                    self.left = tile.right
-                    self._direction = 1
-                else:
-                    self.right = tile.left
-                    self._direction = 0
+    def _on_horizontal_collision(self, tile, dx):
+        if dx < 0:
+            self._direction = 1
+        else:
+            self._direction = 0
 
     # rewritten so mushroom can change direction when touched by a bouncing block
-    def _check_vertical_collisions(self, tiles):
-        for tile in tiles:
-            if self.intersects(tile):
-                if self._vy > 0:
-                    self.bottom = tile.top
-                    if isinstance(tile, level_tiles.Block):
-                        if tile.broken or tile.bouncing:
-                            # make mushroom jump
-                            self._vy = -10
-                            # change direction of the mushroom
-                            if self._direction == 0:
-                                self._direction = 1
-                            else:
-                                self._direction = 0
-                else:
-                    self.top = tile.bottom
+    def _on_vertical_collision(self, tile, dy):
+        if dy > 0:
+            if isinstance(tile, level_tiles.Block):
+                if tile.broken or tile.bouncing:
+                    # make mushroom jump
+                    self._vy = -10
+                    # change direction of the mushroom
+                    if self._direction == 0:
+                        self._direction = 1
+                    else:
+                        self._direction = 0
 
     def draw(self, x_shift):
-        pyxel.blt(self.x + x_shift, self.y, 0, 48, 32, 16, 16, 12)
+        self._image.draw(self.x + x_shift, self.y)
@@ -1,18 +1,40 @@
+import math
 import pyxel
 import random
 
+import profiler
 import settings
 from animation import Image
+from broad_phase import BroadPhase
 from enemies import Goomba, KoopaTroopa
 from items import Mushroom
 from mario import Mario
-from level_tiles import Floor, Block, Pipe, QuestionBlock, CoinBlock, StairBlock, FlagTip, FlagPole, FinishFlag
+from level_tiles import Block, QuestionBlock, CoinBlock
+from level_tiles import FLOOR, STAIR_BLOCK, PIPE_UPPER_LEFT, PIPE_UPPER_RIGHT, PIPE_BOTTOM_RIGHT, PIPE_BOTTOM_LEFT
+from level_tiles import FLAG_POLE, FLAG_TIP, FINISH_FLAG
 from particles import BrokenBlockParticles, Firework
-from settings import TILE_SIZE
+from settings import TILE_SIZE, DRAW_MARGIN
 from settings import SCREEN_WIDTH, SCREEN_HEIGHT
 from settings import STARTING_TIME
+from settings import BACKGROUND_LAYER, WORLD_LAYER, HUD_LAYER
 from settings import FPS
+from settings import MAX_ENEMIES
+from settings import STREAM_BEHIND, STREAM_AHEAD
 from sprite import Sprite
+from tile_map import TileMap
+
+# kind of the static tiles for each character of the level strings
+STATIC_TILE_CHARS = {
+    'F': FLOOR,
+    '■': STAIR_BLOCK,
+    '<': PIPE_UPPER_LEFT,
+    '>': PIPE_UPPER_RIGHT,
+    '(': PIPE_BOTTOM_LEFT,
+    ')': PIPE_BOTTOM_RIGHT,
+    'º': FLAG_TIP,
+    '|': FLAG_POLE,
+    '/': FINISH_FLAG,
+}
 
 
 class Camera:
@@ -42,7 +64,22 @@ class Camera:
     @property
     def x_shift(self):
         # returns the amount that must be added to an element that is drawn
-        return -self._x
+        # it is a whole number of pixels, so everything on screen is drawn at integer coordinates
+        return -math.floor(self._x)
+
+    @property
+    def first_column(self):
+        # first tile column that has to be drawn
+        return int((self._x - DRAW_MARGIN) // TILE_SIZE)
+
+    @property
+    def last_column(self):
+        # last tile column that has to be drawn
+        return int((self._x + SCREEN_WIDTH + DRAW_MARGIN) // TILE_SIZE)
+
+    def is_visible(self, sprite: Sprite) -> bool:
+        # True if the sprite is inside the screen (or its margin), so it must be drawn
+        return sprite.right + DRAW_MARGIN > self._x and sprite.left - DRAW_MARGIN < self._x + SCREEN_WIDTH
 
 
 class Background:
@@ -57,6 +94,9 @@ class Background:
         # multiplier that makes the background move slower
         self._parallax_scroll = 3
         self._change = 0
+        # position of the images the last time they were drawn
+        self._drawn_x1 = None
+        self._drawn_x2 = None
 
     def update(self, x_shift):
         divisor = -x_shift // (self._background_width * self._parallax_scroll)
@@ -70,24 +110,83 @@ class Background:
             self._change += 1
 
     def draw(self, x_shift: int):
+        # the background has its own layer, so it is only drawn again when it moves
+        x1 = self._background1_x + x_shift // self._parallax_scroll
+        x2 = self._background2_x + x_shift // self._parallax_scroll
+        if x1 == self._drawn_x1 and x2 == self._drawn_x2:
+            return
+        self._drawn_x1 = x1
+        self._drawn_x2 = x2
+        pyxel.cls()
         # first background image
-        self._background_image.draw(int(self._background1_x + (x_shift / self._parallax_scroll)), -64)
+        self._background_image.draw(x1, -64)
         # second background image
-        self._background_image.draw(int(self._background2_x + (x_shift / self._parallax_scroll)), -64)
+        self._background_image.draw(x2, -64)
+
+
+class Hud:
+    """Score, coins, time and lives shown at the top of the screen. The HUD has its own layer,
+    so it is only drawn again when one of the values changes
+    """
+
+    def __init__(self):
+        # values drawn in the layer, compared one by one so no tuple is created every frame
+        self._score = None
+        self._coins = None
+        self._time = None
+        self._lives = None
+
+    def draw(self, score: int, coins: int, time: int, lives: int):
+        if score == self._score and coins == self._coins and time == self._time and lives == self._lives:
+            return
+        self._score = score
+        self._coins = coins
+        self._time = time
+        self._lives = lives
+        pyxel.cls()
+        # draw score
+        pyxel.text(8, 12, "MARIO", 7)
+        pyxel.text(8, 20, str(score), 7)
+        # draw coins
+        pyxel.text(64, 12, "x" + str(coins), 7)
+        pyxel.blt(48, 0, 0, 32, 32, -16, 16, 12)
+        # draw time
+        pyxel.text(SCREEN_WIDTH / 1.5, 12, "TIME:" + str(time), 7)
+        pyxel.text(100, 12, "LIVES:" + str(lives), 7)
 
 
 class Level:
-    def __init__(self, level: tuple):
+    def __init__(self, level: tuple, streaming: bool = False, seed: int = None):
+        '''
+        @param streaming: only the columns around the camera are loaded, instead of the whole level
+        @param seed: seed of the random numbers of the level, the same seed and inputs give the same game
+        '''
         self.time = STARTING_TIME
-        self.tiles = []
         self.enemies = []
         self.items = []
         self.particles = []
         self.world_width = len(level[0]) * TILE_SIZE
+        # finds the entities that can collide with each other
+        self.broad_phase = BroadPhase()
         self.level_data = level
-        self.create_level(level)
+        self.streaming = streaming
+        # set when the computer is too slow, optional effects (fireworks) are reduced
+        self.reduced_effects = False
+        # every random choice of the level (coins, enemies, fireworks) is taken from here
+        self.seed = seed
+        self.random = random.Random(seed)
+        # except the coins of the coin blocks, which have their own generator derived from the seed:
+        # columns are loaded at different times when the level is streamed, and the rolls
+        # must not change the numbers of the other choices
+        self._coin_random = random.Random(self.random.getrandbits(64))
+        # coins of each coin block, rolled the first time its column is loaded so resets give the same level
+        self._coin_rolls = {}
         self.camera = Camera(self.world_width)
+        self.create_level(level)
+        # the level is restored from this copy when Mario dies, instead of being created again
+        self._tile_map_snapshot = self.tile_map.snapshot()
         self.background = Background()
+        self.hud = Hud()
         # Mario starts with 5 lives by default
         self.lives = 5
         self.gameover = False
@@ -98,62 +197,63 @@ class Level:
 
     def create_level(self, level: tuple):
         # player spawns at 0, 0 by default
-        self.player = Mario(0, 0)
+        self._player_start = (0, 0)
         for row_index in range(len(level)):
-            row = level[row_index]
-            for col_index in range(len(row)):
-                # character for the tile being currently iterated
-                char = row[col_index]
-                x = col_index * TILE_SIZE
-                y = row_index * TILE_SIZE
-                # player position in level string
-                if char == 'P':
-                    self.player = Mario(x, y)
-                elif char == 'F':
-                    floor = Floor(x, y)
-                    self.tiles.append(floor)
-                elif char == 'B':
-                    block = Block(x, y, True)
-                    self.tiles.append(block)
-                # pipes
-                elif char == '<':
-                    pipe = Pipe(x, y, 0)
-                    self.tiles.append(pipe)
-                elif char == '>':
-                    pipe = Pipe(x, y, 1)
-                    self.tiles.append(pipe)
-                elif char == '(':
-                    pipe = Pipe(x, y, 3)
-                    self.tiles.append(pipe)
-                elif char == ')':
-                    pipe = Pipe(x, y, 2)
-                    self.tiles.append(pipe)
-                # question blocks
-                elif char == 'Q':
-                    question_block = QuestionBlock(x, y, 'mushroom')
-                    self.tiles.append(question_block)
-                # block with coins
-                elif char == 'C':
-                    coin_block = CoinBlock(x, y, random.randint(1, 5))
-                    self.tiles.append(coin_block)
-                elif char == '■':
-                    stair_block = StairBlock(x, y)
-                    self.tiles.append(stair_block)
-                elif char == 'º':
-                    flag_tip = FlagTip(x, y)
-                    self.tiles.append(flag_tip)
-                elif char == '|':
-                    flag_pole = FlagPole(x,y)
-                    self.tiles.append(flag_pole)
-                elif char == '/':
-                    flag = FinishFlag(int(x+TILE_SIZE/2),y)
-                    self.tiles.append(flag)
+            # player position in level string
+            col_index = level[row_index].find('P')
+            if col_index >= 0:
+                self._player_start = (col_index * TILE_SIZE, row_index * TILE_SIZE)
+        self.player = Mario(*self._player_start)
+
+        # tiles of the level, used by entities to find the tiles they can collide with
+        if self.streaming:
+            # room for the columns behind the camera, the screen and the columns ahead
+            window = (STREAM_BEHIND + SCREEN_WIDTH + 2 * DRAW_MARGIN + STREAM_AHEAD) // TILE_SIZE + 2
+            self.tile_map = TileMap(len(level[0]), len(level), self.load_column, window)
+            self.stream_columns()
+        else:
+            self.tile_map = TileMap(len(level[0]), len(level), self.load_column)
+            self.tile_map.load(0, len(level[0]) - 1)
+
+    def load_column(self, col_index: int):
+        # places the tiles of a column of the level string, called by the tile map when it loads it
+        x = col_index * TILE_SIZE
+        for row_index in range(len(self.level_data)):
+            # character for the tile being currently iterated
+            char = self.level_data[row_index][col_index]
+            y = row_index * TILE_SIZE
+            # floor, stairs, pipes and flag only need their kind in the tile map
+            if char in STATIC_TILE_CHARS:
+                self.tile_map.set_kind(col_index, row_index, STATIC_TILE_CHARS[char])
+            elif char == 'B':
+                self.tile_map.add(Block(x, y, True))
+            # question blocks
+            elif char == 'Q':
+                self.tile_map.add(QuestionBlock(x, y, 'mushroom'))
+            # block with coins
+            elif char == 'C':
+                if (col_index, row_index) not in self._coin_rolls:
+                    self._coin_rolls[col_index, row_index] = self._coin_random.randint(1, 5)
+                self.tile_map.add(CoinBlock(x, y, self._coin_rolls[col_index, row_index]))
+
+    def stream_columns(self):
+        # the camera never goes back, so columns far behind it are released and the ones ahead loaded
+        first_column = int((self.camera.minimum_x_mario - STREAM_BEHIND) // TILE_SIZE)
+        self.tile_map.load(first_column, self.camera.last_column + STREAM_AHEAD // TILE_SIZE)
 
     def update(self):
-            self.player.update(self.tiles, self.enemies, self.items, self.particles)
+            # the profiler measures each phase of the update, when it is enabled
+            profiler.start()
+            self.broad_phase.update(self.player, self.enemies, self.items)
+            profiler.mark("broadphase")
+            self.player.update(self.tile_map, self.broad_phase, self.items, self.particles)
+            profiler.mark("mario")
 
             self.camera.focus(self.player)
             self.background.update(self.camera.x_shift)
+            if self.streaming:
+                self.stream_columns()
+            profiler.mark("camera")
 
             # Make Mario not able to go backwards
             if self.player.x < self.camera.minimum_x_mario:
@@ -166,7 +266,7 @@ class Level:
                 # update enemies
                 # iterated backwards so we are able to remove elements while iterating
                 for i in range(len(self.enemies) - 1, -1, -1):
-                    self.enemies[i].update(self.tiles, self.enemies)
+                    self.enemies[i].update(self.tile_map, self.broad_phase.enemies_near(self.enemies[i]))
                     # make enemy disappear if very far from Mario(so new enemies can be generated)
                     if abs(self.player.x - self.enemies[i].x) > SCREEN_WIDTH * 2:
                         del self.enemies[i]
@@ -188,8 +288,9 @@ class Level:
                 if self.flag_y > 80:
                     self.flag_y -= 1
                 if self.time > 0:
-                    if pyxel.frame_count % 10 == 0:
-                        self.particles.append(Firework(SCREEN_WIDTH/2 - self.camera.x_shift, self.flag_y))
+                    # half the fireworks when effects are reduced
+                    if pyxel.frame_count % (20 if self.reduced_effects else 10) == 0:
+                        self.particles.append(Firework(SCREEN_WIDTH/2 - self.camera.x_shift, self.flag_y, self.random))
                     self.player.score += 200
                     self.time -= 2
                 else:
@@ -202,14 +303,15 @@ class Level:
                     else:
                         # quit the game if not enough lives
                         self.gameover = True
-
+            profiler.mark("enemies")
 
             # update items
             # iterated backwards so we are able to remove elements while iterating
             for i in range(len(self.items) - 1, -1, -1):
-                self.items[i].update(self.tiles)
+                self.items[i].update(self.tile_map)
                 if self.items[i].used:
                     del self.items[i]
+            profiler.mark("items")
 
             # update particles
             # iterated backwards so we are able to remove elements while iterating
@@ -217,47 +319,51 @@ class Level:
                 self.particles[i].update()
                 if not self.particles[i].showing:
                     del self.particles[i]
+            profiler.mark("particles")
 
-            # remove broken tiles
-            # iterated backwards so we are able to remove elements while iterating
-            for i in range(len(self.tiles) - 1, -1, -1):
-                self.tiles[i].update()
-                if self.tiles[i].broken:
-                    # add broken block particles
-                    self.particles.append(BrokenBlockParticles(self.tiles[i].x, self.tiles[i].y))
-                    del self.tiles[i]
+            # update the active blocks and remove broken ones
+            for tile in self.tile_map.update():
+                # add broken block particles
+                self.particles.append(BrokenBlockParticles(tile.x, tile.y))
+            profiler.mark("tiles")
 
     def reset_level(self):
         self.time = STARTING_TIME
-        self.tiles = []
+        self.broad_phase = BroadPhase()
         self.enemies = []
         self.items = []
         self.particles = []
-        self.create_level(self.level_data)
         self.camera = Camera(self.world_width)
+        self.player = Mario(*self._player_start)
+        self.tile_map.restore(self._tile_map_snapshot)
         self.background = Background()
 
     def spawn_enemies(self):
-        if len(self.enemies) < 4:
+        if len(self.enemies) < MAX_ENEMIES:
             if pyxel.frame_count % (FPS*5) == 0:
                 # create a koopa troopa 25% probability
-                if random.random() < 0.25:
+                if self.random.random() < 0.25:
                     self.enemies.append(KoopaTroopa(int(SCREEN_WIDTH - self.camera.x_shift), 0))
                 else:
                     self.enemies.append(Goomba(int(SCREEN_WIDTH - self.camera.x_shift), 0))
 
     def draw(self):
-        # clear background with a blue sky color
-        pyxel.cls()
+        profiler.start()
         # background image
+        pyxel.set_layer(BACKGROUND_LAYER)
         self.background.draw(self.camera.x_shift)
+        profiler.mark("draw bg")
+
+        # the world is drawn again every frame
+        pyxel.set_layer(WORLD_LAYER)
+        pyxel.cls()
 
         if self.gameover:
             pyxel.centered_text("Game Over", 7)
 
-        # draw tiles
-        for tile in self.tiles:
-            tile.draw(self.camera.x_shift)
+        # draw tiles, only the columns inside the screen
+        self.tile_map.draw(self.camera.x_shift, self.camera.first_column, self.camera.last_column)
+        profiler.mark("draw tiles")
 
         # draw castle when level player has won level
         if self.player.finishing_on_pole:
@@ -274,30 +380,33 @@ class Level:
 
         # draw enemies
         for enemy in self.enemies:
-            enemy.draw(self.camera.x_shift)
+            if self.camera.is_visible(enemy):
+                enemy.draw(self.camera.x_shift)
 
         # draw items
         for item in self.items:
-            item.draw(self.camera.x_shift)
+            if self.camera.is_visible(item):
+                item.draw(self.camera.x_shift)
 
         # draw particles
         for particle in self.particles:
-            particle.draw(self.camera.x_shift)
+            if self.camera.is_visible(particle):
+                particle.draw(self.camera.x_shift)
+        profiler.mark("draw world")
+
+        # timings of the last frames, on top of the world
+        profiler.draw_overlay(4, SCREEN_HEIGHT - 80)
 
         # HUD elements
-        # draw score
-        pyxel.text(8, 12, "MARIO", 7)
-        pyxel.text(8, 20, str(self.player.score), 7)
-        # draw coins
-        pyxel.text(64, 12, "x" + str(self.player.coins), 7)
-        pyxel.blt(48, 0, 0, 32, 32, -16, 16, 12)
-        # draw time
-        pyxel.text(SCREEN_WIDTH / 1.5, 12, "TIME:" + str(self.time), 7)
-        pyxel.text(100, 12, "LIVES:" + str(self.lives), 7)
+        pyxel.set_layer(HUD_LAYER)
+        self.hud.draw(self.player.score, self.player.coins, self.time, self.lives)
+        profiler.mark("draw hud")
 
     # These following functions are NOT USED IN FINAL VERSION, DEBUGGING PURPOSES
     def add_block(self, x: int, y: int):
-        self.tiles.append(Block(int(x - self.camera.x_shift), y, True))
+        # blocks are placed in the cell that contains the given coordinates
+        x = int(x - self.camera.x_shift)
+        self.tile_map.add(Block(x - x % TILE_SIZE, y - y % TILE_SIZE, True))
 
     def add_goomba(self, x: int, y: int):
         self.enemies.append(Goomba(int(x - self.camera.x_shift), y))
@@ -312,4 +421,4 @@ class Level:
         self.particles.append(BrokenBlockParticles(int(x-self.camera.x_shift),y))
 
     def add_firework(self, x, y):
-        self.particles.append(Firework(int(x-self.camera.x_shift),y))
\ No newline at end of file
+        self.particles.append(Firework(int(x-self.camera.x_shift),y, self.random))
\ No newline at end of file
@@ -1,30 +1,104 @@
-from animation import Animation, Image
+import pyxel
+
+from animation import Image
 from items import Item, Mushroom
 from sprite import Sprite
-import pyxel
 from settings import TILE_SIZE, ITEM_SIZE
 from settings import FPS
 
 
+# Tile kinds, stored in the tile map of the level.
+# Static tiles are only a kind in the map, while stateful tiles (blocks) also have an object
+EMPTY = 0
+FLOOR = 1
+STAIR_BLOCK = 2
+PIPE_UPPER_LEFT = 3
+PIPE_UPPER_RIGHT = 4
+PIPE_BOTTOM_RIGHT = 5
+PIPE_BOTTOM_LEFT = 6
+FLAG_POLE = 7
+FLAG_TIP = 8
+FINISH_FLAG = 9
+BLOCK = 10
+QUESTION_BLOCK = 11
+COIN_BLOCK = 12
+# kind of the colliders that merge several static solid tiles, it is never stored in the map
+SOLID = 13
+
+# static tiles that can be merged into bigger colliders
+SOLID_KINDS = (FLOOR, STAIR_BLOCK, PIPE_UPPER_LEFT, PIPE_UPPER_RIGHT, PIPE_BOTTOM_RIGHT, PIPE_BOTTOM_LEFT)
+
+# images drawn for each static tile kind
+STATIC_TILE_IMAGES = {
+    FLOOR: Image(32, 16, 16, 16, 0),
+    STAIR_BLOCK: Image(48, 16, 16, 16, 0),
+    PIPE_UPPER_LEFT: Image(0, 32, 16, 16, 0),
+    PIPE_UPPER_RIGHT: Image(16, 32, 16, 16, 0),
+    PIPE_BOTTOM_RIGHT: Image(16, 48, 16, 16, 0),
+    PIPE_BOTTOM_LEFT: Image(0, 48, 16, 16, 0),
+    FLAG_POLE: Image(80, 128, 16, 16, 0),
+    FLAG_TIP: Image(80, 112, 16, 16, 0),
+    FINISH_FLAG: Image(80, 96, 16, 16, 0),
+}
+
+# horizontal offset of the static tiles that are not aligned to the grid
+# the finish flag is drawn half a tile to the right so it touches the flag pole
+STATIC_TILE_OFFSETS = {
+    FINISH_FLAG: TILE_SIZE // 2,
+}
+
+
 class Tile(Sprite):
-    def __init__(self, x, y, width=TILE_SIZE, height=TILE_SIZE):
+    def __init__(self, x, y, width=TILE_SIZE, height=TILE_SIZE, kind=EMPTY):
         super().__init__(x, y, width, height)
         self._broken = False
+        self.kind = kind
+        # tile map that updates the tile while it is active
+        self._tile_map = None
 
     def update(self):
         pass
 
+    def attach(self, tile_map):
+        self._tile_map = tile_map
+
+    def _activate(self):
+        # asks the tile map to update the tile every frame until it is idle again
+        if self._tile_map is not None:
+            self._tile_map.activate(self)
+
+    def _changed(self):
+        # tells the tile map that the state of the tile has changed
+        if self._tile_map is not None:
+            self._tile_map.changed(self)
+
     def destroy(self):
         self._broken = True
+        self._changed()
+        self._activate()
+
+    def reset(self):
+        # restores the state the tile had when the level was created
+        self._broken = False
 
     @property
     def broken(self):
         return self._broken
 
+    @property
+    def active(self) -> bool:
+        # True while the tile has to be updated every frame
+        return self._broken
+
+    @property
+    def state(self) -> int:
+        # the state of the tile that lasts, as a number (bouncing is not included)
+        return self._broken
+
 
 class Block(Tile):
     def __init__(self, x, y, breakable: bool = False):
-        super().__init__(x, y)
+        super().__init__(x, y, kind=BLOCK)
         '''
         @param breakable: makes the block a breakable block by Mario when affected by the mushroom power up
         '''
@@ -67,26 +141,28 @@ class Block(Tile):
 
     def bounce(self):
         self._bouncing = True
+        self._activate()
 
-    def destroy(self):
-        self._broken = True
+    def reset(self):
+        super().reset()
+        self._bounce_y = self.y
+        self._bouncing = False
+        self._bounce_count = 0
+
+    @property
+    def active(self) -> bool:
+        return self._bouncing or self._broken
 
     @property
     def breakable(self):
         return self._breakable
 
-class StairBlock(Tile):
-    def __init__(self,x,y):
-        super().__init__(x,y)
-        self._stair_image = Image(48,16,16,16,0)
-
-    def draw(self, x_shift):
-        self._stair_image.draw(self.x + x_shift, self.y)
-
 class CoinBlock(Tile):
     def __init__(self, x, y, coins: int):
-        super().__init__(x, y)
+        super().__init__(x, y, kind=COIN_BLOCK)
         self.coins = coins
+        # coins are restored when the level is reset
+        self._initial_coins = coins
         self._gives_coins = True
         self._block_image = Image(0, 16, 16, 16, 0)
         self._used_block_image = Image(80, 0, 16, 16, 0)
@@ -96,6 +172,12 @@ class CoinBlock(Tile):
             self.coins -= 1
         else:
             self._gives_coins = False
+        self._changed()
+
+    def reset(self):
+        super().reset()
+        self.coins = self._initial_coins
+        self._gives_coins = True
 
     def draw(self, x_shift: int):
         if self.coins > 0:
@@ -107,98 +189,49 @@ class CoinBlock(Tile):
     def gives_coins(self):
         return self._gives_coins
 
+    @property
+    def state(self) -> int:
+        return self.coins << 2 | self._gives_coins << 1 | self._broken
+
 
 class QuestionBlock(Tile):
     def __init__(self, x, y, itemtype: str):
-        super().__init__(x, y)
+        super().__init__(x, y, kind=QUESTION_BLOCK)
         # string for the type of the object that stores the questionblock. "mushroom" for Mushroom
         self.__itemtype = itemtype
         self.__used = False
         self._used_block_image = Image(80, 0, 16, 16, 0)
-        question_frames = []
+        self._question_frames = []
         for i in range(5):
-            question_frames.append(Image(i*16, 0, 16, 16, 0))
-        self._animation = Animation(question_frames, FPS/4)
+            self._question_frames.append(Image(i*16, 0, 16, 16, 0))
+        # frames that every image of the question animation is shown
+        self._frame_time = int(FPS / 4) + 1
 
     def use(self):
         self.__used = True
+        self._changed()
 
     @property
     def used(self):
         return self.__used
 
+    @property
+    def state(self) -> int:
+        return self.__used << 1 | self._broken
+
     def get_item(self) -> Item:
         if self.__itemtype == "mushroom":
             return Mushroom(self.x, self.y - ITEM_SIZE, 1)
 
-    def update(self):
-        self._animation.update()
+    def reset(self):
+        super().reset()
+        self.__used = False
 
     def draw(self, x_shift: int):
         if self.__used:
             # draw used question block image
             self._used_block_image.draw(self.x + x_shift, self.y)
         else:
-            # draw question block image
-            self._animation.draw(self.x + x_shift, self.y)
-
-
-class Floor(Tile):
-    def __init__(self, x, y):
-        # width and height of floor is 16
-        super().__init__(x, y)
-        self._floor_image = Image(32, 16, 16, 16, 0)
-
-    def draw(self, x_shift: int):
-        self._floor_image.draw(self.x + x_shift, self.y)
-
-
-class Pipe(Tile):
-    def __init__(self, x, y, orientation=0):
-        # @param orientation
-        # 0: upper left
-        # 1: upper right
-        # 2: bottom right
-        # 3: bottom left
-        super().__init__(x, y)
-        self.__orientation = orientation
-
-    def draw(self, x_shift):
-        # depending on the orientation of the pipe, a different image is drawn
-        if self.__orientation == 0:
-            pyxel.blt(self.x + x_shift, self.y, 0, 0, 32, 16, 16, 12)
-        elif self.__orientation == 1:
-            pyxel.blt(self.x + x_shift, self.y, 0, 16, 32, 16, 16, 12)
-        elif self.__orientation == 2:
-            pyxel.blt(self.x + x_shift, self.y, 0, 16, 48, 16, 16, 12)
-        elif self.__orientation == 3:
-            pyxel.blt(self.x + x_shift, self.y, 0, 0, 48, 16, 16, 12)
-
-
-class FlagPole(Tile):
-    # flag pole
-    def __init__(self, x, y):
-        super().__init__(x, y)
-        self._flag_pole_image = Image(80, 128, 16, 16, 0)
-
-    def draw(self, x_shift):
-        self._flag_pole_image.draw(self.x + x_shift, self.y)
-
-
-class FlagTip(Tile):
-    # tip of the flag
-    def __init__(self, x, y):
-        super().__init__(x, y)
-        self._flag_tip_image = Image(80, 112, 16, 16, 0)
-
-    def draw(self, x_shift):
-        self._flag_tip_image.draw(self.x + x_shift, self.y)
-
-
-class FinishFlag(Tile):
-    def __init__(self, x, y):
-        super().__init__(x, y)
-        self._finish_flag_image = Image(80, 96, 16, 16, 0)
-
-    def draw(self, x_shift):
-        self._finish_flag_image.draw(self.x + x_shift, self.y)
\ No newline at end of file
+            # the image comes from the frame count, so every question block shows the same one
+            frame = pyxel.frame_count // self._frame_time % len(self._question_frames)
+            self._question_frames[frame].draw(self.x + x_shift, self.y)
@@ -1,12 +1,17 @@
 from js import (
     document,
-    setInterval,
+    requestAnimationFrame,
 )
 
 from pyodide.ffi import create_proxy
 
+import random
+
+import profiler
 import pyxel
+from game_loop import GameLoop
 from level import Level
+from replay import Recorder
 import settings
 
 class App:
@@ -14,36 +19,58 @@ class App:
     def __init__(self):
         canvasDOM = document.querySelector("#canvas")
         
-        # initialize ctx
-        pyxel.init(256, 200, canvasDOM)
+        # initialize ctx, the game is drawn at its size and scaled to the canvas once per frame
+        pyxel.init(settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT, canvasDOM, scale=settings.DISPLAY_SCALE, native=True,
+                   layers=settings.LAYERS)
         pyxel.load_assets(["https://raw.githubusercontent.com/Barrarroso/mariopyscript/main/assets/tiles.png", "https://raw.githubusercontent.com/Barrarroso/mariopyscript/main/assets/spritesheet_mario.png", "https://raw.githubusercontent.com/Barrarroso/mariopyscript/main/assets/background_03.png"])
         
-        self.level = Level(settings.level01)
+        # the game is recorded so it can be replayed, R downloads the recording
+        seed = random.randrange(2 ** 32)
+        self.level = Level(settings.level01, seed=seed)
+        self.recorder = Recorder(seed)
         self.start_game()
     
     def start_game(self):
-        proxy = create_proxy(self.game_loop)
-        setInterval(proxy, 33, "a parameter");
+        # the game is updated FPS times per second and drawn when the display refreshes,
+        # some frames are not drawn if the computer is too slow
+        self.loop = GameLoop(self.update, self.draw, adaptive=True)
+        # the proxy is created once and reused by every requestAnimationFrame
+        self._frame_proxy = create_proxy(self.game_loop)
+        requestAnimationFrame(self._frame_proxy)
 
-    def game_loop(self, *args, **kwargs):
-        #requestAnimationFrame(create_proxy(self.game_loop))
-        self.update()
-        self.draw()
+    def game_loop(self, timestamp):
+        requestAnimationFrame(self._frame_proxy)
+        self.loop.tick(timestamp)
 
     def update(self):
         pyxel.update()
         
         if not pyxel.loading:
+            self.level.reduced_effects = self.loop.skip_ratio > 0
             self.level.update()
+            self.recorder.record(self.level)
+
+        if pyxel.btnp(pyxel.KEY_R):
+            self.recorder.save()
+        # P shows the time of each phase of the frame, H sends their histogram to the console
+        if pyxel.btnp(pyxel.KEY_P):
+            profiler.toggle()
+        if pyxel.btnp(pyxel.KEY_H):
+            profiler.export()
 
 
 
     def draw(self):
-        pyxel.cls()
-        
+        # the level clears the layers it draws
         if not pyxel.loading:
             self.level.draw()
         else:
+            pyxel.cls()
             pyxel.text(100, 100, "Loading...", 7)
 
+        # send the draw calls of the frame to the canvas, where the drawing is actually done
+        profiler.start()
+        pyxel.flush()
+        profiler.mark("flush")
+
 App()
\ No newline at end of file
@@ -2,12 +2,14 @@ import pyxel
 
 import settings
 from animation import Animation, Image
-from level_tiles import Block, QuestionBlock, CoinBlock, FinishFlag, FlagPole, FlagTip
+from broad_phase import BroadPhase
+from level_tiles import Block, QuestionBlock, CoinBlock, FINISH_FLAG, FLAG_POLE, FLAG_TIP
 from enemies import KoopaTroopa
 from entity import Entity
 from items import Mushroom
 from particles import ScoreText, Coin
 from settings import GRAVITY, MAX_ACCELERATION, FPS, WORLD_WIDTH
+from tile_map import TileMap
 
 
 class Mario(Entity):
@@ -77,6 +79,15 @@ class Mario(Entity):
         self._big_grab_frames = []
         for i in range(2):
             self._big_grab_frames.append(Image(112 + i * 16, 56, 16, 32, 1))
+        # actions with a single image have their frames in a list, so they are not created on every change
+        self._small_stand_frames = [self._small_stand_image]
+        self._small_turn_frames = [self._small_turn_image]
+        self._small_jump_frames = [self._small_jump_image]
+        self._big_stand_frames = [self._big_stand_image]
+        self._big_turn_frames = [self._big_turn_image]
+        self._big_jump_frames = [self._big_jump_image]
+        self._big_crouch_frames = [self._big_crouch_image]
+        self._dead_frames = [self._dead_image, self._dead_image, self._dead_image]
         # starts with standing image
         self.animation = Animation()
         self.change_action("stand")
@@ -89,9 +100,10 @@ class Mario(Entity):
             self._vy = MAX_ACCELERATION
 
 
-    def update(self, tiles: list, enemies: list, items: list, particles: list):
+    def update(self, tile_map: TileMap, broad_phase: BroadPhase, items: list, particles: list):
         # since lists are mutable, we are able to change the objects lists in the level class
         # by changing these function parameters
+        # the enemies and items that can collide with Mario are found by the broad phase
         self.animation.update()
         if self.finishing_on_pole:
             # if Mario is touching the flag pole
@@ -100,8 +112,7 @@ class Mario(Entity):
                     self.change_action("grab")
 
                 # mario goes down the flag pole
-                self.y += 2
-                self.__check_vertical_collisions(tiles, items, particles)
+                self.__check_vertical_collisions(tile_map, 2, items, particles)
             else:
                 # mario is at the bottom of the pole
                 if not self.landing_score_added:
@@ -126,8 +137,7 @@ class Mario(Entity):
                     self.change_action("walk")
 
                 self.__apply_gravity()
-                self.y += self._vy
-                self.__check_vertical_collisions(tiles, items, particles)
+                self.__check_vertical_collisions(tile_map, self._vy, items, particles)
                 if self.x >= WORLD_WIDTH - (settings.TILE_SIZE * 8):
                     # Mario is inside castle, finish level
                     self.finishing_inside_castle = True
@@ -175,16 +185,14 @@ class Mario(Entity):
                     self.change_action("stand")
 
                 # Mario's movement and collisions
-                self.x += self._vx
-                self.__check_horizontal_collisions(tiles)
-                self.__check_horizontal_enemies_collision(enemies)
+                self._move_x(tile_map, self._vx)
+                self.__check_horizontal_enemies_collision(broad_phase.player_enemies)
                 self.can_jump = False
-                self.y += self._vy
-                self.__check_vertical_collisions(tiles, items, particles)
-                self.__check_vertical_enemies_collision(enemies, particles)
+                self.__check_vertical_collisions(tile_map, self._vy, items, particles)
+                self.__check_vertical_enemies_collision(broad_phase.player_enemies, particles)
 
                 # Collision with items
-                self.__check_items_collision(items, particles)
+                self.__check_items_collision(broad_phase.player_items, particles)
 
                 if self.x < 0:
                     self.x = 0
@@ -215,70 +223,58 @@ class Mario(Entity):
                 else:
                     self.change_action("walk")
 
-    def __check_horizontal_collisions(self, tiles: list):
-        for tile in tiles:
-            if super().intersects(tile):
-                if self._direction == 0:
-                    self.left = tile.right
-                else:
-                    if not self.finishing_on_pole:
-                        if isinstance(tile, (FlagPole, FlagTip)):
-                            self.landing_flag_pole_y = tile.y
-                            self.center_x = tile.center_x
-                            self.finishing_on_pole = True
-                        elif isinstance(tile, FinishFlag):
-                            pass
-                        else:
-                            self.right = tile.left
-                    else:
-                        if not isinstance(tile, (FlagPole, FinishFlag, FlagTip)):
-                            self.right = tile.left
-
-    def __check_vertical_collisions(self, tiles: list, items: list, particles: list):
-        for i in range(len(tiles)):
-            # if the rectangle of mario and tile overlap
-            if super().intersects(tiles[i]):
-                if isinstance(tiles[i], (FinishFlag, FlagTip, FlagPole)):
-                    pass
-                else:
-                    # If Mario's velocity is positive, then he is touching ground
-                    if self._vy > 0:
-                        self.bottom = tiles[i].top
-                        # Mario can jump because he is touching ground
-                        self.can_jump = True
-
-                    # hitting block with head
+    def _blocked_by(self, tile) -> bool:
+        # Mario goes through the flag
+        return tile.kind not in (FLAG_POLE, FLAG_TIP, FINISH_FLAG)
+
+    def _on_touch(self, tile):
+        # Mario grabs the flag pole when touching it
+        if not self.finishing_on_pole and tile.kind in (FLAG_POLE, FLAG_TIP):
+            self.landing_flag_pole_y = tile.y
+            self.center_x = tile.center_x
+            self.finishing_on_pole = True
+
+    def __check_vertical_collisions(self, tile_map: TileMap, dy, items: list, particles: list):
+        # moves Mario vertically, tile is the tile that stopped him (if any)
+        tile = self._move_y(tile_map, dy)
+        if tile is None:
+            return
+        # If Mario is moving down, then he is touching ground
+        if dy > 0:
+            # Mario can jump because he is touching ground
+            self.can_jump = True
+
+        # hitting block with head
+        else:
+            # check if the tile is an instance of Block
+            if isinstance(tile, Block):
+                # check if the block is breakable
+                if tile.breakable:
+                    # if mario is big block will be destroyed
+                    if self.big:
+                        tile.destroy()
+                    # if mario is small block will bounce
                     else:
-                        self.top = tiles[i].bottom
-                        # check if the tile is an instance of Block
-                        if isinstance(tiles[i], Block):
-                            # check if the block is breakable
-                            if tiles[i].breakable:
-                                # if mario is big block will be destroyed
-                                if self.big:
-                                    tiles[i].destroy()
-                                # if mario is small block will bounce
-                                else:
-                                    tiles[i].bounce()
-                        elif isinstance(tiles[i], QuestionBlock):
-                            if not tiles[i].used:
-                                # make sure that the question block can't be used again
-                                tiles[i].use()
-                                # if the item in the QuestionBlock is a Mushroom
-                                if isinstance(tiles[i].get_item(), Mushroom):
-                                    # just add a coin if Mario is already big
-                                    if self.big:
-                                        self.add_coin(tiles[i].x, tiles[i].y, particles)
-                                        self.increase_score(100, particles)
-                                    # create the Mushroom if Mario is small
-                                    else:
-                                        items.append(tiles[i].get_item())
-                        elif isinstance(tiles[i], CoinBlock):
-                            tiles[i].hit()
-                            if tiles[i].gives_coins:
-                                self.add_coin(tiles[i].x, tiles[i].y, particles)
-                                self.increase_score(100, particles)
-                    self._vy = 0
+                        tile.bounce()
+            elif isinstance(tile, QuestionBlock):
+                if not tile.used:
+                    # make sure that the question block can't be used again
+                    tile.use()
+                    # if the item in the QuestionBlock is a Mushroom
+                    if isinstance(tile.get_item(), Mushroom):
+                        # just add a coin if Mario is already big
+                        if self.big:
+                            self.add_coin(tile.x, tile.y, particles)
+                            self.increase_score(100, particles)
+                        # create the Mushroom if Mario is small
+                        else:
+                            items.append(tile.get_item())
+            elif isinstance(tile, CoinBlock):
+                tile.hit()
+                if tile.gives_coins:
+                    self.add_coin(tile.x, tile.y, particles)
+                    self.increase_score(100, particles)
+        self._vy = 0
 
     def __check_horizontal_enemies_collision(self, enemies):
         for enemy in enemies:
@@ -377,9 +373,9 @@ class Mario(Entity):
             if new_action == "stand":
                 self.animation.set_delay(FPS / 6)
                 if self.big:
-                    self.animation.set_frames([self._big_stand_image])
+                    self.animation.set_frames(self._big_stand_frames)
                 else:
-                    self.animation.set_frames([self._small_stand_image])
+                    self.animation.set_frames(self._small_stand_frames)
             elif new_action == "walk":
                 self.animation.set_delay(FPS / 6)
                 if self.big:
@@ -389,15 +385,15 @@ class Mario(Entity):
             elif new_action == "turn":
                 self.animation.set_delay(FPS / 6)
                 if self.big:
-                    self.animation.set_frames([self._big_turn_image])
+                    self.animation.set_frames(self._big_turn_frames)
                 else:
-                    self.animation.set_frames([self._small_turn_image])
+                    self.animation.set_frames(self._small_turn_frames)
             elif new_action == "jump":
                 self.animation.set_delay(FPS / 6)
                 if self.big:
-                    self.animation.set_frames([self._big_jump_image])
+                    self.animation.set_frames(self._big_jump_frames)
                 else:
-                    self.animation.set_frames([self._small_jump_image])
+                    self.animation.set_frames(self._small_jump_frames)
             elif new_action == "grow":
                 # can only grow when Mario is small
                 self.animation.set_delay(FPS / 15)
@@ -405,7 +401,7 @@ class Mario(Entity):
             elif new_action == "crouch":
                 # can only crouch when Mario is big
                 self.animation.set_delay(FPS / 6)
-                self.animation.set_frames([self._big_crouch_image])
+                self.animation.set_frames(self._big_crouch_frames)
             elif new_action == "grab":
                 self.animation.set_delay(FPS / 6)
                 if self.big:
@@ -415,7 +411,7 @@ class Mario(Entity):
             elif new_action == "death":
                 # Mario can only die when small
                 self.animation.set_delay(FPS)
-                self.animation.set_frames([self._dead_image,self._dead_image,self._dead_image])
+                self.animation.set_frames(self._dead_frames)
             else:
                 # action does not exist
                 raise ValueError("Action", new_action, "is not valid")
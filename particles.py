@@ -1,11 +1,20 @@
 import pyxel
 
-from random import randint
+import random
 from animation import Image, Animation
 from settings import FPS
 from settings import GRAVITY
 from sprite import Sprite
 
+# the images of the particles are the same for all of them, so they are created only once
+_coin_frames = []
+for i in range(3):
+    _coin_frames.append(Image(i * 8, 144, 8, 16, 0))
+_firework_frames = []
+for i in range(3):
+    _firework_frames.append(Image(32 + i * 16, 144, 16, 16, 0))
+_broken_block_image = Image(80, 24, 8, 8, 0)
+
 
 class Particle(Sprite):
     """Defines a particle, which has a boolean to know
@@ -38,6 +47,7 @@ class ScoreText(Particle):
         self._time_count = 0
         self._max_time = FPS
         self._score = score
+        self._text = str(score)
 
     def update(self):
         if self._time_count >= self._max_time:
@@ -49,7 +59,7 @@ class ScoreText(Particle):
 
     def draw(self, x_shift):
         if self._showing:
-            pyxel.text(self.x + x_shift, self.y, str(self._score), 7)
+            pyxel.text(self.x + x_shift, self.y, self._text, 7)
 
 
 class Coin(Particle):
@@ -66,11 +76,7 @@ class Coin(Particle):
         # useful to make coin jump and fall
         self._vy = -10
         # Particle will last for half a second
-
-        self._coin_frames = []
-        for i in range(3):
-            self._coin_frames.append(Image(i * 8, 144, 8, 16, 0))
-        self._animation = Animation(self._coin_frames, FPS / 5)
+        self._animation = Animation(_coin_frames, FPS / 5)
 
     def update(self):
         self._animation.update()
@@ -103,8 +109,27 @@ class BrokenBlockParticles(Particle):
                 self._particles.append(BrokenBlockParticle(x, y, i))
 
     def update(self):
+        showing = False
         for particle in self._particles:
             particle.update()
+            if particle.showing:
+                showing = True
+        # the level deletes it when the 4 little particles have disappeared
+        if not showing:
+            self._showing = False
+            return
+        # the area of this particle covers the 4 little particles, so the level knows when it is on screen
+        first = self._particles[0]
+        left, top, right, bottom = first.x, first.y, first.right, first.bottom
+        for particle in self._particles:
+            left = min(left, particle.x)
+            top = min(top, particle.y)
+            right = max(right, particle.right)
+            bottom = max(bottom, particle.bottom)
+        self.x = left
+        self.y = top
+        self.width = right - left
+        self.height = bottom - top
 
     def draw(self, x_shift):
         for particle in self._particles:
@@ -147,7 +172,7 @@ class BrokenBlockParticle(Particle):
         self._time_count = 0
         self._max_time = FPS
         # broken block particle image
-        self._image = Image(80, 24, 8, 8, 0)
+        self._image = _broken_block_image
 
     def update(self):
         if self._time_count >= self._max_time:
@@ -177,18 +202,17 @@ class Firework(Particle):
     and is inside the castle
     """
 
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng: random.Random = random):
+        '''
+        @param rng: source of the random velocities, the level passes its own so games can be replayed
+        '''
         super().__init__(x, y)
         # useful to make firework jump and fall
-        self._vy = randint(-6, -2)
+        self._vy = rng.randint(-6, -2)
         # random velocity for the x axis
-        self._vx = randint(-10, 10)
+        self._vx = rng.randint(-10, 10)
         # Particle will last for half a second
-
-        self._firework_frames = []
-        for i in range(3):
-            self._firework_frames.append(Image(32 + i * 16, 144, 16, 16, 0))
-        self._animation = Animation(self._firework_frames, FPS / 10)
+        self._animation = Animation(_firework_frames, FPS / 10)
 
     def update(self):
         self._animation.update()
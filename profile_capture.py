@@ -0,0 +1,68 @@
+"""Captures of cProfile, to find the functions where the time of real games is spent.
+Pressing C starts a capture: the ticks of the game loop are profiled until PROFILE_CAPTURE_FRAMES
+updates have been run, then the functions with the most cumulative time are sent to the console
+and downloaded as a text file. The game loop calls begin_tick and end_tick around every tick,
+so nothing is measured while there is no capture.
+"""
+import cProfile
+import os
+import pstats
+
+import pyxel
+from settings import PROFILE_CAPTURE_FRAMES
+
+# functions in the report
+REPORT_FUNCTIONS = 30
+
+_profile = None
+_frames = 0
+_key_pressed = False
+
+
+def begin_tick():
+    global _profile, _frames, _key_pressed
+    # a capture starts when the key is pressed, not while it is held
+    key_pressed = pyxel.btn(pyxel.KEY_C)
+    if key_pressed and not _key_pressed and _profile is None:
+        _profile = cProfile.Profile()
+        _frames = 0
+        pyxel.log("profiling %d frames" % PROFILE_CAPTURE_FRAMES)
+    _key_pressed = key_pressed
+
+    if _profile is not None:
+        _profile.enable()
+
+
+def end_tick(frames: int):
+    # @param frames: number of updates done in the tick
+    global _profile, _frames
+    if _profile is None:
+        return
+    _profile.disable()
+    _frames += frames
+    if _frames >= PROFILE_CAPTURE_FRAMES:
+        text = report(_profile, _frames)
+        _profile = None
+        pyxel.log(text)
+        pyxel.download("mario_profile.txt", text.encode())
+
+
+def _function_name(function: tuple) -> str:
+    file, line, name = function
+    if file == "~":
+        # built-in function
+        return name
+    return "%s:%d(%s)" % (os.path.basename(file), line, name)
+
+
+def report(profile: cProfile.Profile, frames: int) -> str:
+    # table of the functions with the most cumulative time, with their time and calls per frame
+    stats = pstats.Stats(profile).stats
+    functions = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    lines = ["%d frames, top %d functions by cumulative time" % (frames, REPORT_FUNCTIONS),
+             "%10s %10s %10s %12s  %s" % ("cum ms", "ms/frame", "own ms", "calls/frame", "function")]
+    for function, (primitive_calls, calls, own_time, cumulative_time, callers) in functions[:REPORT_FUNCTIONS]:
+        lines.append("%10.1f %10.3f %10.1f %12.1f  %s" % (
+            cumulative_time * 1000, cumulative_time * 1000 / frames, own_time * 1000,
+            calls / frames, _function_name(function)))
+    return "\n".join(lines)
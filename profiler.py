@@ -0,0 +1,210 @@
+"""Timings of the phases of a frame (broad phase, Mario, enemies, items, particles, tiles, each part
+of the draw and the flush of the draw calls to the canvas).
+The level marks the end of every phase, the time since the previous mark is added to that phase
+along with the number of blits done in it. Only the last ROLLING_SAMPLES samples of each phase are kept.
+
+It does nothing until it is enabled, then the timings are shown in an overlay on the screen
+and can be sent to the console as a histogram.
+
+It can also track the objects created in each phase, which is much slower and only used
+by the allocations report (allocations.py). The garbage collector keeps every new object
+in its youngest generation, so the objects of that generation when a phase ends are the ones
+the phase created and kept, and tracemalloc tells the line where each one was created.
+Numbers and strings are not tracked by the garbage collector, so they are not counted.
+Temporary objects are gone when the phase ends, so they are measured by the bytes allocated
+during the phase: the peak of tracemalloc, which starts from 0 in every phase. Lists, tuples,
+dicts and floats reuse the memory of deleted ones without asking for new memory, so those
+free lists are emptied first, and then every object created in the phase is traced.
+"""
+import gc
+import time
+import tracemalloc
+from array import array
+
+import pyxel
+
+# samples kept of every phase, 2 seconds of frames
+ROLLING_SAMPLES = 60
+# upper limits in milliseconds of the bars of the histogram, the last bar has the rest
+HISTOGRAM_LIMITS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33)
+
+enabled = False
+# phases in the order they were first marked
+_phases = {}
+_last_time = 0
+_last_blits = 0
+# set by track_allocations
+_tracking = False
+# objects created in each line ("file:line") and still alive at the end of its phase
+allocation_lines = {}
+# the same objects by type
+allocation_types = {}
+
+
+class Phase:
+    """Last samples of a phase, in rings so no memory is allocated when they are added"""
+
+    def __init__(self):
+        self.times = array('f', bytes(4 * ROLLING_SAMPLES))
+        self.blits = array('i', bytes(4 * ROLLING_SAMPLES))
+        # objects created in the phase that are still alive at its end,
+        # and the maximum bytes allocated at the same time during the phase, temporary objects included
+        self.objects = array('i', bytes(4 * ROLLING_SAMPLES))
+        self.allocated_bytes = array('i', bytes(4 * ROLLING_SAMPLES))
+        self.count = 0
+
+    def add(self, milliseconds: float, blits: int, objects: int = 0, allocated_bytes: int = 0):
+        index = self.count % ROLLING_SAMPLES
+        self.times[index] = milliseconds
+        self.blits[index] = blits
+        self.objects[index] = objects
+        self.allocated_bytes[index] = allocated_bytes
+        self.count += 1
+
+    @property
+    def samples(self) -> int:
+        return min(self.count, ROLLING_SAMPLES)
+
+    def average(self) -> float:
+        return sum(self.times) / max(self.samples, 1)
+
+    def maximum(self) -> float:
+        return max(self.times)
+
+    def average_blits(self) -> float:
+        return sum(self.blits) / max(self.samples, 1)
+
+
+def track_allocations(tracking: bool = True):
+    # starts (or stops) tracking the objects created in every phase, the profiler must be enabled
+    global _tracking
+    _tracking = tracking
+    if tracking:
+        allocation_lines.clear()
+        allocation_types.clear()
+        tracemalloc.start()
+        # objects must stay in the youngest generation until their phase ends
+        gc.disable()
+        _reset_allocations()
+    else:
+        tracemalloc.stop()
+        gc.unfreeze()
+        gc.enable()
+
+
+def _reset_allocations():
+    # the objects that exist now are moved out of the youngest generation,
+    # a full collection empties the free lists (frozen objects are not collected)
+    gc.freeze()
+    gc.collect()
+    tracemalloc.clear_traces()
+
+
+def _allocations() -> tuple:
+    # objects created since the last reset that are still alive, and the peak of allocated bytes
+    current, peak = tracemalloc.get_traced_memory()
+    objects = gc.get_objects(0)
+    count = 0
+    for obj in objects:
+        traceback = tracemalloc.get_object_traceback(obj)
+        # objects of the profiler are not counted
+        if obj is objects or (traceback is not None and traceback[0].filename == __file__):
+            continue
+        count += 1
+        if traceback is None:
+            # objects that reuse the memory of a deleted object of the same type (lists, dicts)
+            # are not traced by tracemalloc, they are described by the objects that have them.
+            # Frozen objects are not searched for referrers, they are frozen again by the next reset
+            gc.unfreeze()
+            owners = [type(owner).__name__ for owner in gc.get_referrers(obj) if owner is not objects]
+            line = "%s in %s" % (type(obj).__name__, owners[0] if owners else "nothing")
+        else:
+            line = "%s:%d" % (traceback[0].filename, traceback[0].lineno)
+        allocation_lines[line] = allocation_lines.get(line, 0) + 1
+        name = type(obj).__name__
+        allocation_types[name] = allocation_types.get(name, 0) + 1
+    del objects
+    return count, peak
+
+
+def toggle():
+    global enabled
+    enabled = not enabled
+    if enabled:
+        # the samples of the last time it was enabled are old
+        _phases.clear()
+
+
+def start():
+    # the next phase starts now
+    global _last_time, _last_blits
+    if not enabled:
+        return
+    _last_time = time.perf_counter()
+    _last_blits = pyxel.blit_count
+    if _tracking:
+        _reset_allocations()
+
+
+def mark(phase: str):
+    # the given phase has finished, the next one starts now
+    global _last_time, _last_blits
+    if not enabled:
+        return
+    objects = allocated_bytes = 0
+    if _tracking:
+        # read before the profiler creates anything
+        objects, allocated_bytes = _allocations()
+    now = time.perf_counter()
+    stats = _phases.get(phase)
+    if stats is None:
+        stats = Phase()
+        _phases[phase] = stats
+    stats.add((now - _last_time) * 1000, pyxel.blit_count - _last_blits, objects, allocated_bytes)
+    if _tracking:
+        # the next phase doesn't include the tracing and the samples of this one
+        now = time.perf_counter()
+    _last_time = now
+    _last_blits = pyxel.blit_count
+    if _tracking:
+        # the objects created by the profiler are not counted in the next phase
+        _reset_allocations()
+
+
+def phases() -> dict:
+    return _phases
+
+
+def draw_overlay(x: int, y: int):
+    # average and maximum milliseconds, and average blits, of every phase, one line each
+    if not enabled:
+        return
+    pyxel.text(x, y, "PHASE        AVG   MAX  BLT", 7)
+    for name, stats in _phases.items():
+        y += 6
+        pyxel.text(x, y, "%-10s %5.2f %5.2f %4d" % (name[:10], stats.average(), stats.maximum(), stats.average_blits()), 7)
+    # the time of the overlay is not added to the next phase
+    start()
+
+
+def histogram() -> str:
+    # number of samples of each phase inside every bar of the histogram, as a table
+    lines = ["last %d samples, ms" % ROLLING_SAMPLES]
+    header = "%-12s" % "phase"
+    for limit in HISTOGRAM_LIMITS:
+        header += "%7s" % ("<" + str(limit))
+    header += "%7s" % (">=" + str(HISTOGRAM_LIMITS[-1]))
+    lines.append(header)
+    for name, stats in _phases.items():
+        bars = [0] * (len(HISTOGRAM_LIMITS) + 1)
+        for i in range(stats.samples):
+            bar = 0
+            while bar < len(HISTOGRAM_LIMITS) and stats.times[i] >= HISTOGRAM_LIMITS[bar]:
+                bar += 1
+            bars[bar] += 1
+        lines.append("%-12s" % name + "".join("%7d" % count for count in bars))
+    return "\n".join(lines)
+
+
+def export():
+    pyxel.log(histogram())
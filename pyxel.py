@@ -1,18 +1,146 @@
+import math
+from array import array
+
 from js import (
     document,
+    window,
     Element,
+    Function,
+    Array,
+    ImageData,
+    Uint8Array,
+    Uint8ClampedArray,
+    Blob,
+    URL,
+    Object,
+    console,
 )
+from pyodide.ffi import to_js
 from pyodide.ffi.wrappers import add_event_listener
 
+import font
+
 ctx = None
 canvas_width = 0
 canvas_height = 0
 frame_count = 0
-imageBank = [] # image bank of max length 3
+imageBank = [] # the 3 image banks of the assets, followed by the surfaces
 loadedImages = 0
 loading = True
 
 _scale = 1
+# Layers are canvases stacked on top of each other (the first one is at the bottom).
+# A layer keeps what was drawn on it until it is cleared, so layers that don't change
+# are not drawn again. Contexts where the layers are drawn:
+_layers = None
+# in native mode, contexts of the visible canvases where the layers are presented
+_displays = None
+_native_size = (0, 0)
+_display_scale = 1
+# set when the visible canvases are resized, which clears them: the next flush presents every layer
+_present_all = False
+
+# Draw calls are not sent to the canvas one by one: they are stored as commands in a buffer
+# that is drawn by a javascript function once per frame (flush), so there is only one call
+# from python to javascript per frame instead of several calls for each blit.
+# Every command has COMMAND_SIZE numbers, the first one is the type of command
+COMMAND_SIZE = 10
+_CLS = 0
+# image bank, source x, y, width, height, destination x, y, flip (1 horizontal, 2 vertical)
+_BLT = 1
+# image bank of the surface, -1 for the current layer
+_TARGET = 2
+# index of the layer
+_LAYER = 3
+_commands = array('f')
+# number of commands drawn in the last flush
+command_count = 0
+# number of images drawn since the beginning: calls to blt and characters of texts
+blit_count = 0
+# debug counter of the blits that received coordinates that are not whole pixels,
+# it should stay at 0 because sprites are snapped to whole pixels before being drawn
+non_integer_blits = 0
+# images of the banks, in a javascript array so they are not converted every frame
+_images = None
+# flipped copies of the asset images, 3 for each bank: horizontal, vertical and both
+# (the copy of a flip is at bank * 3 + flip - 1), so flipped blits don't change the canvas transform
+_flipped_images = None
+_draw_commands = None
+
+# colors of the texts as RGB, only white (7) is used by the game
+TEXT_COLORS = {
+    7: (255, 255, 255),
+}
+# image bank of the font atlas of each color
+_font_banks = {}
+
+_DRAW_COMMANDS_JS = '''
+const view = buffer.getBuffer("f32");
+const d = view.data;
+let layer = 0;
+let target = layers[0];
+let scale = screenScale;
+// layers that have been drawn in this frame, all of them when the visible canvases were cleared
+const changed = [];
+if (presentAll) layers.forEach((_, l) => { changed[l] = true; });
+for (let i = 0; i < count * size; i += size) {
+    switch (d[i]) {
+    case 0:
+        target.clearRect(0, 0, target.canvas.width, target.canvas.height);
+        if (target === layers[layer]) changed[layer] = true;
+        break;
+    case 1: {
+        if (target === layers[layer]) changed[layer] = true;
+        const w = d[i + 4] * scale, h = d[i + 5] * scale;
+        let x = d[i + 6] * scale, y = d[i + 7] * scale;
+        const flip = d[i + 8];
+        if (!flip) {
+            target.drawImage(images[d[i + 1]], d[i + 2], d[i + 3], d[i + 4], d[i + 5], x, y, w, h);
+            break;
+        }
+        const atlas = flipped[d[i + 1] * 3 + flip - 1];
+        if (atlas) {
+            // the source rectangle is mirrored inside the flipped copy
+            const sx = flip & 1 ? atlas.width - d[i + 2] - d[i + 4] : d[i + 2];
+            const sy = flip & 2 ? atlas.height - d[i + 3] - d[i + 5] : d[i + 3];
+            target.drawImage(atlas, sx, sy, d[i + 4], d[i + 5], x, y, w, h);
+            break;
+        }
+        // surfaces have no flipped copies
+        target.save();
+        target.scale(flip & 1 ? -1 : 1, flip & 2 ? -1 : 1);
+        if (flip & 1) x = -x - w;
+        if (flip & 2) y = -y - h;
+        target.drawImage(images[d[i + 1]], d[i + 2], d[i + 3], d[i + 4], d[i + 5], x, y, w, h);
+        target.restore();
+        break;
+    }
+    case 2:
+        if (d[i + 1] < 0) {
+            target = layers[layer];
+            scale = screenScale;
+        } else {
+            target = images[d[i + 1]].getContext("2d");
+            scale = 1;
+        }
+        break;
+    case 3:
+        layer = d[i + 1];
+        target = layers[layer];
+        scale = screenScale;
+        break;
+    }
+}
+view.release();
+if (displays) {
+    // native mode: a single nearest-neighbour blit scales each changed layer to its visible canvas
+    changed.forEach((_, l) => {
+        const display = displays[l];
+        display.clearRect(0, 0, display.canvas.width, display.canvas.height);
+        display.drawImage(layers[l].canvas, 0, 0, display.canvas.width, display.canvas.height);
+    });
+}
+'''
 
 KEY_LEFT = 37
 KEY_UP = 38
@@ -23,14 +151,26 @@ KEY_B = 66
 
 KEY_SPACE = 32
 
+KEY_R = 82
+KEY_P = 80
+KEY_H = 72
+KEY_C = 67
+
 _pressedKeys = {
     KEY_LEFT: False, 
     KEY_UP: False, 
     KEY_RIGHT: False, 
     KEY_DOWN: False,
     KEY_B: False,
-    KEY_SPACE: False
+    KEY_SPACE: False,
+    KEY_R: False,
+    KEY_P: False,
+    KEY_H: False,
+    KEY_C: False
 }
+# keys pressed at the last update and at the one before, to know the keys pressed in this frame
+_frameKeys = dict(_pressedKeys)
+_previousKeys = dict(_pressedKeys)
 
 def _handle_input(e):
     global _pressedKeys
@@ -39,20 +179,88 @@ def _handle_input(e):
     elif e.type == "keyup":
         _pressedKeys[e.keyCode] = False
 
-def init(width: int, height: int, canvas: Element, scale: int = 1,):
-    global ctx
-    ctx = canvas.getContext("2d", {'alpha': False})
-
-    ctx.mozImageSmoothingEnabled = False
-    ctx.webkitImageSmoothingEnabled = False
-    ctx.msImageSmoothingEnabled = False
-    ctx.imageSmoothingEnabled = False
-
-    canvas.style.width = f"{width*scale}px"
-    canvas.style.height = f"{height*scale}px"
+def _disable_smoothing(context):
+    context.mozImageSmoothingEnabled = False
+    context.webkitImageSmoothingEnabled = False
+    context.msImageSmoothingEnabled = False
+    context.imageSmoothingEnabled = False
+
+def _resize_display(e=None):
+    # sets the size of the visible canvases in native mode, in pixels of the device so they are sharp on HiDPI screens
+    width, height = _native_size
+    scale = _display_scale
+    if scale == "fit":
+        scale = min(window.innerWidth / width, window.innerHeight / height)
+    for display in _displays:
+        style = display.canvas.style
+        # the visible canvases already have the size of the screen, so the scale and position
+        # of the stylesheet (used when the browser scales the canvases) are replaced
+        style.transform = "none"
+        style.width = f"{int(width*scale)}px"
+        style.height = f"{int(height*scale)}px"
+        if _display_scale == "fit":
+            # centered in the window
+            style.position = "fixed"
+            style.left = f"{int((window.innerWidth - width*scale) / 2)}px"
+            style.top = f"{int((window.innerHeight - height*scale) / 2)}px"
+        else:
+            # at the top left corner of the game container
+            style.left = "0px"
+            style.top = "0px"
+        display.canvas.width = int(width * scale * window.devicePixelRatio)
+        display.canvas.height = int(height * scale * window.devicePixelRatio)
+        # changing the size of a canvas resets its context
+        _disable_smoothing(display)
+    global _present_all
+    _present_all = True
+
+def _create_layer_canvases(canvas: Element, layers: int) -> list:
+    # the canvas of the page is the first layer, the others are placed after it so they are drawn on top
+    canvases = [canvas]
+    for i in range(1, layers):
+        layer = document.createElement('canvas')
+        canvas.parentElement.insertBefore(layer, canvases[-1].nextSibling)
+        canvases.append(layer)
+    return canvases
+
+def init(width: int, height: int, canvas: Element, scale: int = 1, native: bool = False, layers: int = 1):
+    '''
+    @param scale: size of a pixel of the game in the screen. In native mode it can also be "fit" to fill the window
+    @param native: everything is drawn in a canvas of width x height, which is scaled to the visible canvas
+    with a single blit per frame, instead of scaling every blit
+    @param layers: number of layers, see set_layer
+    '''
+    canvases = _create_layer_canvases(canvas, layers)
+    global _layers, _displays
+    _layers = Array.new()
+    if native:
+        global _native_size, _display_scale
+        _displays = Array.new()
+        for i in range(layers):
+            # only the first layer is opaque
+            _displays.push(canvases[i].getContext("2d", {'alpha': i > 0}))
+        _native_size = (width, height)
+        _display_scale = scale
+        _resize_display()
+        if scale == "fit":
+            add_event_listener(window, "resize", _resize_display)
+
+        # the game is drawn without scale and scaled once when presented
+        canvases = [document.createElement('canvas') for i in range(layers)]
+        scale = 1
+
+    for i in range(layers):
+        layer_ctx = canvases[i].getContext("2d", {'alpha': i > 0})
+        _disable_smoothing(layer_ctx)
+        if not native:
+            canvases[i].style.width = f"{width*scale}px"
+            canvases[i].style.height = f"{height*scale}px"
+        canvases[i].width = width*scale
+        canvases[i].height = height*scale
+        _layers.push(layer_ctx)
 
-    canvas.width = width*scale
-    canvas.height = height*scale
+    global ctx
+    ctx = _layers[0]
 
     global canvas_width
     canvas_width = width*scale
@@ -62,6 +270,12 @@ def init(width: int, height: int, canvas: Element, scale: int = 1,):
     global _scale
     _scale = scale
 
+    global _images, _flipped_images, _draw_commands
+    _images = Array.new()
+    _flipped_images = Array.new()
+    _draw_commands = Function.new("buffer", "count", "size", "images", "flipped", "layers", "screenScale",
+                                  "displays", "presentAll", _DRAW_COMMANDS_JS)
+
     ctx.clearRect(0, 0, width*scale, height*scale)
 
      #init input
@@ -82,75 +296,158 @@ def init(width: int, height: int, canvas: Element, scale: int = 1,):
 # inputs
 def btn(key: int):
     return _pressedKeys[key]
+
+def btnp(key: int):
+    # True only in the frame the key starts being pressed
+    return _frameKeys[key] and not _previousKeys[key]
     
 def handle_image_load(e):
     global loadedImages
     loadedImages += 1
 
+def _draw_flipped(image, atlases: list):
+    # draws the flipped copies of an image once it has been loaded
+    for flip in range(1, 4):
+        atlas = atlases[flip - 1]
+        atlas.width = image.width
+        atlas.height = image.height
+        atlas_ctx = atlas.getContext("2d")
+        atlas_ctx.scale(-1 if flip & 1 else 1, -1 if flip & 2 else 1)
+        atlas_ctx.drawImage(image, -image.width if flip & 1 else 0, -image.height if flip & 2 else 0)
+
+def _handle_asset_load(image, atlases: list):
+    def handle_load(e):
+        _draw_flipped(image, atlases)
+        handle_image_load(e)
+    return handle_load
+
 def load_assets(assets: list):
     global imageBank
     for imageSrc in assets:
         image = document.createElement('img')
         image.src = imageSrc
-        
-        add_event_listener(image, "load", handle_image_load)
+
+        # the flipped copies are created now so they keep the order of the banks
+        atlases = []
+        for flip in range(1, 4):
+            atlas = document.createElement('canvas')
+            _flipped_images.push(atlas)
+            atlases.append(atlas)
+
+        add_event_listener(image, "load", _handle_asset_load(image, atlases))
         imageBank.append(image)
+        _images.push(image)
+
+def create_surface(width: int, height: int) -> int:
+    # creates an offscreen canvas that can be used as an image bank, returns its index
+    surface = document.createElement('canvas')
+    surface.width = width
+    surface.height = height
+    surface.getContext("2d").imageSmoothingEnabled = False
+    imageBank.append(surface)
+    _images.push(surface)
+    return len(imageBank) - 1
+
+def set_target(surface: int = None):
+    # makes the next draw calls draw into the given surface, or into the current layer if None
+    # surfaces have the size of the game, they are scaled when drawn on the screen
+    _commands.extend((_TARGET, -1 if surface is None else surface, 0, 0, 0, 0, 0, 0, 0, 0))
+
+def set_layer(layer: int):
+    # makes the next draw calls draw into the given layer, every frame starts drawing into layer 0
+    _commands.extend((_LAYER, layer, 0, 0, 0, 0, 0, 0, 0, 0))
+
+def flush():
+    # draws the commands of the frame, must be called once at the end of every frame
+    global command_count, _present_all
+    command_count = len(_commands) // COMMAND_SIZE
+    if command_count > 0 or _present_all:
+        _draw_commands(_commands, command_count, COMMAND_SIZE, _images, _flipped_images, _layers, _scale, _displays,
+                       _present_all)
+        _present_all = False
+    del _commands[:]
 
 def update():
     global frame_count
     frame_count += 1
+    _previousKeys.update(_frameKeys)
+    _frameKeys.update(_pressedKeys)
     global loading
     if loadedImages >= 3:
         loading = False
 
 def cls(col=0):
-    ctx.clearRect(0, 0, canvas_width, canvas_height)
+    _commands.extend((_CLS, 0, 0, 0, 0, 0, 0, 0, 0, 0))
 
 def blt(x, y, image_bank: int, _x, _y, width, height, transparent_col=0):
     if loading:
         return
     #x, y refer to the position on the screen to draw
     #_x, _y refer to the position of the image in the image bank
-
-    #in javascript:
-    #ctx.drawImage(image, sourceX, sourceY, sWidth, sHeight, destinationX, destinationY, dWidth, dHeight)
-    ctx.save()
-
-    if (width < 0) and (height < 0):
-        #flip horizontally and vertically
-        ctx.scale(-1, -1)
-        ctx.drawImage(imageBank[image_bank], _x, _y, -width, -height, -x * _scale, -y * _scale, width*_scale, height*_scale)
-
-    elif width < 0:
-        #flip horizontally
-        ctx.scale(-1, 1)
-        ctx.drawImage(imageBank[image_bank], _x, _y, -width, height, -x * _scale, y * _scale, width*_scale, height*_scale)
-
-    elif height < 0:
-        #flip vertically
-        ctx.scale(1, -1)
-        ctx.drawImage(imageBank[image_bank], _x, _y, width, -height, x * _scale, -y * _scale, width*_scale, height*_scale)
-    
-    else:
-        ctx.drawImage(imageBank[image_bank], _x, _y, width, height, x * _scale, y * _scale, width*_scale, height*_scale)
-
-    ctx.restore()
-
+    #negative width or height flip the image horizontally or vertically
+    global blit_count
+    blit_count += 1
+    if x != int(x) or y != int(y):
+        global non_integer_blits
+        non_integer_blits += 1
+    flip = 0
+    if width < 0:
+        flip |= 1
+    if height < 0:
+        flip |= 2
+    _commands.extend((_BLT, image_bank, _x, _y, abs(width), abs(height), x, y, flip, 0))
+
+
+def _font_bank(color) -> int:
+    # returns the image bank of the font atlas of a color, it is created the first time the color is used
+    bank = _font_banks.get(color)
+    if bank is None:
+        atlas = document.createElement('canvas')
+        atlas.width = font.ATLAS_WIDTH
+        atlas.height = font.ATLAS_HEIGHT
+        pixels = Uint8ClampedArray.new(to_js(font.rasterize(*TEXT_COLORS.get(color, TEXT_COLORS[7]))))
+        atlas.getContext("2d").putImageData(ImageData.new(pixels, font.ATLAS_WIDTH, font.ATLAS_HEIGHT), 0, 0)
+        imageBank.append(atlas)
+        _images.push(atlas)
+        bank = len(imageBank) - 1
+        _font_banks[color] = bank
+    return bank
+
+def _draw_text(x, y, string: str, color):
+    # every character is a blit from the font atlas
+    # y is the baseline of the text, like in the canvas fillText, and texts are drawn on whole pixels
+    x = math.floor(x)
+    y = math.floor(y) - font.GLYPH_HEIGHT
+    bank = _font_bank(color)
+    run = font.glyph_run(string)
+    global blit_count
+    blit_count += len(run)
+    for glyph_x, offset in run:
+        _commands.extend((_BLT, bank, glyph_x, 0, font.GLYPH_WIDTH, font.GLYPH_HEIGHT, x + offset, y, 0, 0))
 
 def text(x, y, text: str, color):
-    ctx.font = "11px Monospace"
-    ctx.textAlign = 'left'
-    if(color == 7):
-        ctx.fillStyle = '#fff'
-
-    ctx.fillText(text, x*_scale, y*_scale)
+    _draw_text(x, y, text, color)
 
 def centered_text(text: str, color):
-    if color == 7:
-        ctx.fillStyle = '#fff'
-
-    ctx.textAlign = 'center'
-    ctx.fillText(text, (canvas_width*_scale) / 2, (canvas_height*_scale) / 2)
+    # draws the text in the center of the screen
+    width = canvas_width // _scale
+    height = canvas_height // _scale
+    _draw_text((width - font.text_width(text)) // 2, (height + font.GLYPH_HEIGHT) // 2, text, color)
+
+def download(filename: str, data: bytes):
+    # the browser saves the data as a file
+    array = Uint8Array.new(len(data))
+    array.assign(data)
+    blob = Blob.new(to_js([array]), to_js({"type": "application/octet-stream"}, dict_converter=Object.fromEntries))
+    url = URL.createObjectURL(blob)
+    link = document.createElement("a")
+    link.href = url
+    link.download = filename
+    link.click()
+    URL.revokeObjectURL(url)
+
+def log(message: str):
+    console.log(message)
 
 def quit():
     pass
@@ -0,0 +1,218 @@
+"""Headless version of the pyxel module, used to run the game with plain Python (no browser).
+It has the same functions as pyxel.py but nothing is drawn: input is set by the script
+that drives the game, and draw calls can be recorded to check what would be drawn.
+
+It must be installed before importing any module of the game:
+
+    import pyxel_headless
+    pyxel_headless.install()
+    from level import Level
+"""
+import math
+import sys
+
+import font
+
+canvas_width = 0
+canvas_height = 0
+frame_count = 0
+# the 3 image banks of the assets, surfaces are added after them
+imageBank = [None, None, None]
+# there are no images to wait for
+loading = False
+
+_scale = 1
+
+KEY_LEFT = 37
+KEY_UP = 38
+KEY_RIGHT = 39
+KEY_DOWN = 40
+
+KEY_B = 66
+
+KEY_SPACE = 32
+
+KEY_R = 82
+KEY_P = 80
+KEY_H = 72
+KEY_C = 67
+
+_pressedKeys = set()
+# keys pressed at the last update and at the one before
+_frameKeys = set()
+_previousKeys = set()
+# function that receives the frame count and returns the keys pressed in that frame
+_input_script = None
+
+# number of draw calls done since the beginning
+draw_count = 0
+# number of draw calls of the last frame (the ones before the last flush)
+command_count = 0
+# number of images drawn since the beginning: calls to blt and characters of texts
+blit_count = 0
+_frame_draw_count = 0
+# blits that received coordinates that are not whole pixels
+non_integer_blits = 0
+# draw calls done while recording, as tuples with the function name and its arguments
+draw_calls = []
+_recording = False
+# image bank of the font atlas of each color
+_font_banks = {}
+
+
+def install():
+    # makes "import pyxel" return this module
+    sys.modules['pyxel'] = sys.modules[__name__]
+
+
+def init(width: int, height: int, canvas=None, scale: int = 1, native: bool = False, layers: int = 1):
+    global canvas_width, canvas_height, _scale
+    if native:
+        # the game is drawn without scale and presented scaled
+        scale = 1
+    canvas_width = width * scale
+    canvas_height = height * scale
+    _scale = scale
+
+
+# inputs
+def btn(key: int):
+    return key in _pressedKeys
+
+
+def btnp(key: int):
+    return key in _frameKeys and key not in _previousKeys
+
+
+def press(*keys: int):
+    _pressedKeys.update(keys)
+
+
+def release(*keys: int):
+    _pressedKeys.difference_update(keys)
+
+
+def set_keys(keys):
+    # replaces the pressed keys
+    _pressedKeys.clear()
+    _pressedKeys.update(keys)
+
+
+def set_input_script(script):
+    '''
+    @param script: function called on every update with the frame count, returns the pressed keys.
+    None stops the script and keeps the keys pressed
+    '''
+    global _input_script
+    _input_script = script
+
+
+def record(enabled: bool = True):
+    # starts (or stops) recording the draw calls in draw_calls
+    global _recording
+    _recording = enabled
+
+
+def clear_draw_calls():
+    draw_calls.clear()
+
+
+def load_assets(assets: list):
+    imageBank[:len(assets)] = assets
+
+
+def create_surface(width: int, height: int) -> int:
+    # surfaces are image banks that can be drawn into, returns its index
+    imageBank.append((width, height))
+    return len(imageBank) - 1
+
+
+def set_target(surface: int = None):
+    _draw_call("set_target", surface)
+
+
+def set_layer(layer: int):
+    _draw_call("set_layer", layer)
+
+
+def flush():
+    global command_count, _frame_draw_count
+    command_count = draw_count - _frame_draw_count
+    _frame_draw_count = draw_count
+
+
+def update():
+    global frame_count
+    frame_count += 1
+    if _input_script is not None:
+        set_keys(_input_script(frame_count))
+    _previousKeys.clear()
+    _previousKeys.update(_frameKeys)
+    _frameKeys.clear()
+    _frameKeys.update(_pressedKeys)
+
+
+def _draw_call(*args):
+    global draw_count
+    draw_count += 1
+    if _recording:
+        draw_calls.append(args)
+
+
+def cls(col=0):
+    _draw_call("cls", col)
+
+
+def blt(x, y, image_bank: int, _x, _y, width, height, transparent_col=0):
+    if loading:
+        return
+    global blit_count
+    blit_count += 1
+    if x != int(x) or y != int(y):
+        global non_integer_blits
+        non_integer_blits += 1
+    _draw_call("blt", x, y, image_bank, _x, _y, width, height, transparent_col)
+
+
+def _font_bank(color) -> int:
+    bank = _font_banks.get(color)
+    if bank is None:
+        bank = create_surface(font.ATLAS_WIDTH, font.ATLAS_HEIGHT)
+        _font_banks[color] = bank
+    return bank
+
+
+def _draw_text(x, y, string: str, color):
+    # texts are blits from the font atlas, like in pyxel.py
+    x = math.floor(x)
+    y = math.floor(y) - font.GLYPH_HEIGHT
+    bank = _font_bank(color)
+    run = font.glyph_run(string)
+    global blit_count
+    blit_count += len(run)
+    for glyph_x, offset in run:
+        _draw_call("blt", x + offset, y, bank, glyph_x, 0, font.GLYPH_WIDTH, font.GLYPH_HEIGHT, 0)
+
+
+def text(x, y, text: str, color):
+    _draw_text(x, y, text, color)
+
+
+def centered_text(text: str, color):
+    width = canvas_width // _scale
+    height = canvas_height // _scale
+    _draw_text((width - font.text_width(text)) // 2, (height + font.GLYPH_HEIGHT) // 2, text, color)
+
+
+def download(filename: str, data: bytes):
+    # there is no browser, the file is written in the working directory
+    with open(filename, "wb") as file:
+        file.write(data)
+
+
+def log(message: str):
+    print(message)
+
+
+def quit():
+    pass
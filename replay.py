@@ -0,0 +1,213 @@
+"""Recording and replay of games. While the game runs, the recorder keeps the keys pressed
+in every update and the seed of the level, which is all it takes to play the same game again:
+the replay creates the level with that seed and updates it with the same keys.
+The streaming mode and a checksum of the level are recorded too, a recording can't be
+replayed on a different level.
+A checksum of the state is saved for every frame, so the replay can tell the first frame
+where it doesn't match the recorded game.
+
+Replays run without a browser and as fast as possible:
+
+    python replay.py mario_replay.bin
+"""
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+if __name__ == "__main__":
+    # outside the browser the game runs with the headless version of pyxel
+    import pyxel_headless
+    pyxel_headless.install()
+
+import pyxel
+import settings
+from level import Level
+
+# keys saved in every frame, each one is a bit of the byte of the frame
+RECORDED_KEYS = (pyxel.KEY_LEFT, pyxel.KEY_UP, pyxel.KEY_RIGHT, pyxel.KEY_DOWN, pyxel.KEY_B, pyxel.KEY_SPACE)
+# the last bit of the byte is set when the level had its effects reduced
+REDUCED_EFFECTS_BIT = 0x80
+
+MAGIC = b"MREC"
+VERSION = 3
+# magic, version, seed, frame count when the recording started, number of frames,
+# streaming mode and checksum of the level
+HEADER = struct.Struct("<4sBIII?I")
+
+
+def level_checksum(level_data: tuple) -> int:
+    # identifies the level that was recorded
+    return zlib.crc32("\n".join(level_data).encode())
+
+
+# numbers of the state of the level, in an array reused by every checksum so the recorder
+# doesn't create objects in every frame
+_state = array("d")
+# checksums of the names of the types of entities and the actions of Mario
+_name_ids = {}
+
+
+def _name_id(name: str) -> int:
+    name_id = _name_ids.get(name)
+    if name_id is None:
+        name_id = zlib.crc32(name.encode())
+        _name_ids[name] = name_id
+    return name_id
+
+
+def state_checksum(level: Level) -> int:
+    # checksum of the state of the level that changes while playing
+    player = level.player
+    enemies = level.enemies
+    items = level.items
+    particles = level.particles
+    size = 15 + 3 * (len(enemies) + len(items)) + 2 * len(particles)
+    # the array only changes its size when the number of entities changes
+    state = _state
+    while len(state) < size:
+        state.append(0)
+    if len(state) > size:
+        del state[size:]
+    state[0] = player.x
+    state[1] = player.y
+    state[2] = player.big
+    state[3] = player.score
+    state[4] = player.coins
+    state[5] = _name_id(player.action)
+    state[6] = level.time
+    state[7] = level.lives
+    state[8] = level.gameover
+    state[9] = level.flag_y
+    state[10] = level.camera.x_shift
+    # broken blocks, used blocks and coins taken
+    state[11] = level.tile_map.digest
+    state[12] = len(enemies)
+    state[13] = len(items)
+    state[14] = len(particles)
+    i = 15
+    for enemy in enemies:
+        state[i] = _name_id(type(enemy).__name__)
+        state[i + 1] = enemy.x
+        state[i + 2] = enemy.y
+        i += 3
+    for item in items:
+        state[i] = _name_id(type(item).__name__)
+        state[i + 1] = item.x
+        state[i + 2] = item.y
+        i += 3
+    for particle in particles:
+        state[i] = particle.x
+        state[i + 1] = particle.y
+        i += 2
+    return zlib.crc32(state)
+
+
+class Recording:
+    """Seed of the level and keys of every frame of a game, with the checksum of the state
+    after each frame
+    """
+
+    def __init__(self, seed: int, start_frame: int, inputs: bytes = b"", checksums=(),
+                 streaming: bool = False, level_checksum: int = 0):
+        '''
+        @param start_frame: frame count of the first recorded update
+        @param inputs: one byte per frame with the pressed keys
+        @param streaming: the level was streamed
+        @param level_checksum: checksum of the level data, see level_checksum
+        '''
+        self.seed = seed
+        self.start_frame = start_frame
+        self.streaming = streaming
+        self.level_checksum = level_checksum
+        self.inputs = bytearray(inputs)
+        self.checksums = array("I", checksums)
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def to_bytes(self) -> bytes:
+        # the inputs barely change between frames, so they compress very well
+        header = HEADER.pack(MAGIC, VERSION, self.seed, self.start_frame, len(self.inputs),
+                             self.streaming, self.level_checksum)
+        return header + zlib.compress(bytes(self.inputs) + self.checksums.tobytes(), 9)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        # the version is checked before the rest of the header, which changes between versions
+        magic, version = struct.unpack_from("<4sB", data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a recording of this version of the game")
+        magic, version, seed, start_frame, frames, streaming, checksum = HEADER.unpack_from(data)
+        body = zlib.decompress(data[HEADER.size:])
+        checksums = array("I")
+        checksums.frombytes(body[frames:])
+        return cls(seed, start_frame, body[:frames], checksums, streaming, checksum)
+
+
+class Recorder:
+    """Records the game while it is played, it is called after every update of the level"""
+
+    def __init__(self, seed: int):
+        self.recording = None
+        self.seed = seed
+
+    def record(self, level: Level):
+        if self.recording is None:
+            self.recording = Recording(self.seed, pyxel.frame_count, streaming=level.streaming,
+                                       level_checksum=level_checksum(level.level_data))
+        keys = 0
+        for bit in range(len(RECORDED_KEYS)):
+            if pyxel.btn(RECORDED_KEYS[bit]):
+                keys |= 1 << bit
+        if level.reduced_effects:
+            keys |= REDUCED_EFFECTS_BIT
+        self.recording.inputs.append(keys)
+        self.recording.checksums.append(state_checksum(level))
+
+    def save(self, filename: str = "mario_replay.bin"):
+        if self.recording is not None:
+            pyxel.download(filename, self.recording.to_bytes())
+
+
+def replay(recording: Recording, level_data: tuple = settings.level01, draw: bool = True) -> int:
+    '''
+    Plays a recording with the headless version of pyxel
+    @param draw: the level is also drawn, like in the game
+    @return: the first frame whose state doesn't match the recording, -1 if all of them match
+    '''
+    if level_checksum(level_data) != recording.level_checksum:
+        raise ValueError("the recording is of another level")
+    # the level is created before the first update, like in main.py
+    pyxel.frame_count = 0
+    level = Level(level_data, streaming=recording.streaming, seed=recording.seed)
+    pyxel.frame_count = recording.start_frame - 1
+    for frame in range(len(recording)):
+        keys = recording.inputs[frame]
+        pyxel.set_keys([RECORDED_KEYS[bit] for bit in range(len(RECORDED_KEYS)) if keys & (1 << bit)])
+        pyxel.update()
+        level.reduced_effects = keys & REDUCED_EFFECTS_BIT != 0
+        level.update()
+        if draw:
+            level.draw()
+            pyxel.flush()
+        if state_checksum(level) != recording.checksums[frame]:
+            return frame
+    return -1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python replay.py <recording> [--no-draw]")
+        sys.exit(1)
+    with open(sys.argv[1], "rb") as file:
+        recording = Recording.from_bytes(file.read())
+    start = time.perf_counter()
+    frame = replay(recording, draw="--no-draw" not in sys.argv)
+    elapsed = time.perf_counter() - start
+    if frame < 0:
+        print("replayed", len(recording), "frames in", round(elapsed, 2), "s, every frame matches")
+    else:
+        print("state differs from the recording at frame", frame)
+        sys.exit(1)
@@ -15,12 +15,33 @@ level01 = (
 )
 # Application settings
 FPS = 30
+# maximum number of updates run in a frame when the game is behind
+MAX_FRAME_STEPS = 5
+# maximum number of consecutive frames that are not drawn when the computer is too slow
+MAX_SKIPPED_DRAWS = 3
+# updates profiled by a capture of the profiler (C key)
+PROFILE_CAPTURE_FRAMES = 300
 SCREEN_WIDTH = 256
 SCREEN_HEIGHT = 200
+# size of a pixel of the game in the page, the game container of styles.css has the same scale (--scale)
+DISPLAY_SCALE = 3
 
 # Level
 STARTING_TIME = 500
+# layers of the screen, from bottom to top. Each one is only drawn again when it changes
+BACKGROUND_LAYER = 0
+WORLD_LAYER = 1
+HUD_LAYER = 2
+LAYERS = 3
 TILE_SIZE = 16
+# extra pixels drawn at both sides of the screen, so sprites partially inside it are not cut
+DRAW_MARGIN = TILE_SIZE
+# width in pixels of the surfaces where the static tiles are pre-rendered
+CHUNK_WIDTH = 256
+# pixels of the level kept loaded behind and ahead of the screen when the level is streamed.
+# Enemies are deleted when they are two screens away from Mario, so they always have floor
+STREAM_BEHIND = SCREEN_WIDTH * 2
+STREAM_AHEAD = SCREEN_WIDTH
 # total width of the world in pixels
 WORLD_WIDTH = len(level01[0])*TILE_SIZE
 ITEM_SIZE = 16
@@ -30,7 +51,14 @@ GRAVITY = 1
 MAX_ACCELERATION = 10
 
 # Enemies
+# maximum number of enemies alive at the same time
+MAX_ENEMIES = 4
 GOOMBA_SPEED = 1
 KOOPA_SPEED = 1
 # fixed area where a koopa walks
 KOOPA_AREA = 64
+
+# Collisions
+# distance added to both sides of every entity in the broad phase, must cover
+# how much two entities can move towards each other during a frame
+BROAD_PHASE_MARGIN = 8
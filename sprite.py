@@ -72,6 +72,135 @@ class Sprite:
         if type(center_y) == int:
             self.y = center_y - self.height / 2
 
+    def _move_x(self, tile_map, dx):
+        """Moves the sprite dx pixels horizontally, stopping at the first tile that blocks it.
+        The tiles are found with a single query of the area swept by the movement, so fast sprites
+        can't go through tiles. Returns the tile that stopped the sprite or None
+        """
+        if dx == 0:
+            return None
+        left = self.left
+        right = self.right
+        if dx > 0:
+            tiles = tile_map.query_area(left, self.top, right + dx, self.bottom)
+        else:
+            tiles = tile_map.query_area(left + dx, self.top, right, self.bottom)
+        hit = None
+        touching = False
+        # distance moved until the first blocking tile is touched (time of impact)
+        distance = dx
+        for tile in tiles:
+            impact = self._impact_x(tile, dx, left, right)
+            if impact is None:
+                continue
+            if not self._blocked_by(tile):
+                touching = True
+            elif (dx > 0 and impact < distance) or (dx < 0 and impact > distance):
+                distance = impact
+                hit = tile
+        if hit is None:
+            self.x += dx
+        elif dx > 0:
+            # placed right next to the tile
+            self.x = hit.left - self.width
+        else:
+            self.x = hit.right
+        if touching:
+            # tiles that don't block the sprite but were reached before stopping, found again
+            # now that the distance is known so no list of them is needed
+            for tile in tiles:
+                if not self._blocked_by(tile):
+                    impact = self._impact_x(tile, dx, left, right)
+                    if impact is not None and ((dx > 0 and impact < distance) or (dx < 0 and impact > distance)):
+                        self._on_touch(tile)
+        if hit is not None:
+            self._on_horizontal_collision(hit, dx)
+        return hit
+
+    def _move_y(self, tile_map, dy):
+        """Moves the sprite dy pixels vertically, stopping at the first tile that blocks it.
+        Works like _move_x
+        """
+        if dy == 0:
+            return None
+        top = self.top
+        bottom = self.bottom
+        if dy > 0:
+            tiles = tile_map.query_area(self.left, top, self.right, bottom + dy)
+        else:
+            tiles = tile_map.query_area(self.left, top + dy, self.right, bottom)
+        hit = None
+        touching = False
+        distance = dy
+        for tile in tiles:
+            impact = self._impact_y(tile, dy, top, bottom)
+            if impact is None:
+                continue
+            if not self._blocked_by(tile):
+                touching = True
+            elif (dy > 0 and impact < distance) or (dy < 0 and impact > distance):
+                distance = impact
+                hit = tile
+        if hit is None:
+            self.y += dy
+        elif dy > 0:
+            self.y = hit.top - self.height
+        else:
+            self.y = hit.bottom
+        if touching:
+            for tile in tiles:
+                if not self._blocked_by(tile):
+                    impact = self._impact_y(tile, dy, top, bottom)
+                    if impact is not None and ((dy > 0 and impact < distance) or (dy < 0 and impact > distance)):
+                        self._on_touch(tile)
+        if hit is not None:
+            self._on_vertical_collision(hit, dy)
+        return hit
+
+    def _impact_x(self, tile, dx, left, right):
+        # distance from the sprite (between left and right) to the tile when moving dx pixels,
+        # None if the tile is not reached
+        # only tiles at the same height as the sprite can be hit when moving horizontally
+        if tile.bottom <= self.top or tile.top >= self.bottom:
+            return None
+        if dx > 0:
+            # tiles behind the sprite or too far away are not reached
+            if tile.right <= left or tile.left >= right + dx:
+                return None
+            return tile.left - right
+        if tile.left >= right or tile.right <= left + dx:
+            return None
+        return tile.right - left
+
+    def _impact_y(self, tile, dy, top, bottom):
+        # same as _impact_x when moving dy pixels vertically
+        # only tiles in the same column as the sprite can be hit when moving vertically
+        if tile.right <= self.left or tile.left >= self.right:
+            return None
+        if dy > 0:
+            if tile.bottom <= top or tile.top >= bottom + dy:
+                return None
+            return tile.top - bottom
+        if tile.top >= bottom or tile.bottom <= top + dy:
+            return None
+        return tile.bottom - top
+
+    def _blocked_by(self, tile) -> bool:
+        # True if the tile stops the sprite when moving, every tile is solid by default
+        return True
+
+    def _on_touch(self, tile):
+        # called when the sprite moves through a tile that doesn't block it
+        pass
+
+    def _on_horizontal_collision(self, tile, dx):
+        # called when the sprite is stopped by a tile while moving horizontally
+        pass
+
+    def _on_vertical_collision(self, tile, dy):
+        # called when the sprite is stopped by a tile while moving vertically
+        pass
+
     def intersects(self, sprite):
         if isinstance(sprite, Sprite):
             return self.left < sprite.right and\
@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+
+# the game modules are at the root of the repository, and run with the headless pyxel
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import pyxel_headless
+pyxel_headless.install()
+
+import pyxel
+from level_tiles import QuestionBlock
+from settings import FPS, TILE_SIZE
+
+
+def _image(block: QuestionBlock) -> tuple:
+    # source coordinates of the image the block draws in the current frame
+    pyxel.clear_draw_calls()
+    pyxel.record()
+    block.draw(0)
+    pyxel.record(False)
+    blits = [call for call in pyxel.draw_calls if call[0] == "blt"]
+    return blits[0][4:6]
+
+
+class QuestionBlockTest(unittest.TestCase):
+
+    def test_blocks_created_on_different_frames_draw_the_same_image(self):
+        pyxel.frame_count = 0
+        first = QuestionBlock(0, 0, "mushroom")
+        # the second block is created when the first one is in the middle of an image
+        pyxel.frame_count = 13
+        second = QuestionBlock(20 * TILE_SIZE, 0, "mushroom")
+        for frame in range(13, 120):
+            pyxel.frame_count = frame
+            self.assertEqual(_image(first), _image(second))
+
+    def test_images_change_every_quarter_of_a_second(self):
+        block = QuestionBlock(0, 0, "mushroom")
+        frame_time = int(FPS / 4) + 1
+        images = []
+        for frame in range(5 * frame_time):
+            pyxel.frame_count = frame
+            images.append(_image(block))
+        for frame in range(5 * frame_time):
+            # the image is the same during frame_time frames, then the next one is shown
+            self.assertEqual(images[frame], images[frame - frame % frame_time])
+            if frame % frame_time == 0 and frame > 0:
+                self.assertNotEqual(images[frame], images[frame - 1])
+        # after the last image the animation starts again
+        pyxel.frame_count = 5 * frame_time
+        self.assertEqual(_image(block), images[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
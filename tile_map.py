@@ -0,0 +1,384 @@
+import pyxel
+import struct
+import zlib
+from array import array
+
+from level_tiles import Tile, EMPTY, SOLID, SOLID_KINDS, STATIC_TILE_IMAGES, STATIC_TILE_OFFSETS
+from settings import TILE_SIZE, CHUNK_WIDTH
+from sprite import Sprite
+
+# column, row, kind and state of a stateful tile that has changed
+TILE_CHANGE = struct.Struct("<iiii")
+
+
+class TileMap:
+    """Stores the tiles of a level as an array of tile kinds indexed by column and row.
+    Only the stateful tiles (blocks that can bounce, break, or give items) are kept as objects,
+    in a dictionary with their cell as key. Static tiles (floor, stairs, pipes, flag) are
+    just a byte in the array.
+
+    For collisions, contiguous static solid tiles are merged into big rectangles (colliders),
+    so an entity walking on the floor checks one collider instead of one tile per cell.
+
+    Static tiles are drawn once into surfaces of CHUNK_WIDTH pixels (chunks), so drawing them
+    every frame only needs one blit per visible chunk. Stateful tiles are drawn on top of them.
+
+    Columns are created when load() asks the level for them. If the window is smaller than the
+    number of columns, the arrays only have room for window columns and are used as a ring buffer,
+    so the columns on the left are released before new ones take their place
+    """
+
+    def __init__(self, columns: int, rows: int, load_column, window: int = None):
+        self._columns = columns
+        self._rows = rows
+        # function of the level that places the tiles of a column, given its index
+        self._load_column = load_column
+        if window is None or window > columns:
+            window = columns
+        self._window = window
+        # loaded columns, from _first_col to _end_col - 1
+        self._first_col = 0
+        self._end_col = 0
+        # column-major: the cells of a column are contiguous, index = (column % window) * rows + row
+        self._kinds = bytearray(window * rows)
+        # stateful tiles, the key is the index of their cell
+        self._tiles = {}
+        # colliders of the static tiles, removed colliders leave a None so indexes don't change
+        self._colliders = []
+        self._free_colliders = []
+        # index + 1 of the collider that covers each cell, 0 if the cell has no collider
+        self._collider_at = array('i', bytes(4 * window * rows))
+        # while columns are being loaded colliders are not rebuilt for every tile
+        self._loading = False
+        # stateful tiles that are updated every frame, used as an ordered set
+        self._active = {}
+        # tiles broken in the last update
+        self._broken = []
+        # tiles found by the last query
+        self._query = []
+        # checksum of every change of the stateful tiles (broken blocks, used blocks, coins taken),
+        # so the state of all of them can be compared without reading them
+        self.digest = 0
+        self._change = bytearray(TILE_CHANGE.size)
+        # surfaces with the static tiles of each chunk, rendered the first time the chunk is drawn
+        self._chunk_columns = CHUNK_WIDTH // TILE_SIZE
+        self._chunk_surfaces = {}
+        # surfaces of released chunks, reused by new chunks
+        self._free_surfaces = []
+        # chunks whose static tiles have changed since they were rendered
+        self._dirty_chunks = set()
+
+    def __cell(self, col: int, row: int) -> int:
+        return (col % self._window) * self._rows + row
+
+    @property
+    def first_loaded_column(self) -> int:
+        return self._first_col
+
+    @property
+    def last_loaded_column(self) -> int:
+        return self._end_col - 1
+
+    def kind(self, col: int, row: int) -> int:
+        if self._first_col <= col < self._end_col and 0 <= row < self._rows:
+            return self._kinds[self.__cell(col, row)]
+        return EMPTY
+
+    def set_kind(self, col: int, row: int, kind: int):
+        # places a static tile (or removes the tile if kind is EMPTY)
+        cell = self.__cell(col, row)
+        self._kinds[cell] = kind
+        if cell in self._tiles:
+            self._active.pop(self._tiles[cell], None)
+            del self._tiles[cell]
+        self.__invalidate_chunks(col, col)
+        if not self._loading:
+            self.__rebuild_colliders(col, col, row, row)
+
+    def add(self, tile: Tile):
+        # places a stateful tile in the cell of its coordinates
+        col = int(tile.x // TILE_SIZE)
+        row = int(tile.y // TILE_SIZE)
+        cell = self.__cell(col, row)
+        if self._kinds[cell] != EMPTY and cell not in self._tiles:
+            # the tile replaced a static tile
+            self.__invalidate_chunks(col, col)
+        self._kinds[cell] = tile.kind
+        self._tiles[cell] = tile
+        tile.attach(self)
+        if tile.active:
+            self.activate(tile)
+        if not self._loading and self._collider_at[cell]:
+            # the tile replaced a static tile
+            self.__rebuild_colliders(col, col, row, row)
+
+    def remove(self, tile: Tile):
+        cell = self.__cell(int(tile.x // TILE_SIZE), int(tile.y // TILE_SIZE))
+        if self._tiles.get(cell) is tile:
+            self._kinds[cell] = EMPTY
+            del self._tiles[cell]
+            self._active.pop(tile, None)
+
+    def load(self, first_col: int, last_col: int):
+        """Makes the given columns the loaded ones. Columns on the left of first_col are
+        released, and the columns up to last_col that were not loaded yet are created.
+        The camera never goes back, so released columns are never loaded again
+        """
+        first_col = max(first_col, self._first_col)
+        last_col = min(last_col, self._columns - 1, first_col + self._window - 1)
+        if first_col > self._first_col:
+            self.__release(first_col)
+        if last_col >= self._end_col:
+            new_col = self._end_col
+            self._loading = True
+            for col in range(new_col, last_col + 1):
+                self._load_column(col)
+            self._loading = False
+            self._end_col = last_col + 1
+            self.__invalidate_chunks(new_col, last_col)
+            # the new columns may be merged with the colliders of the last loaded column
+            self.__rebuild_colliders(new_col, last_col, 0, self._rows - 1)
+
+    def __release(self, first_col: int):
+        # removes every tile and collider of the columns on the left of first_col
+        last_col = min(first_col, self._end_col) - 1
+        # colliders that also cover loaded columns are merged again for those columns
+        merge_last_col = last_col
+        for col in range(self._first_col, last_col + 1):
+            for row in range(self._rows):
+                cell = self.__cell(col, row)
+                index = self._collider_at[cell] - 1
+                if index >= 0:
+                    merge_last_col = max(merge_last_col, int((self._colliders[index].right - 1) // TILE_SIZE))
+                    self.__remove_collider(index)
+                if cell in self._tiles:
+                    self._active.pop(self._tiles[cell], None)
+                    del self._tiles[cell]
+                self._kinds[cell] = EMPTY
+        self._first_col = first_col
+        self._end_col = max(self._end_col, first_col)
+        # the surfaces of the chunks that are not loaded anymore can be used by new chunks
+        for chunk in list(self._chunk_surfaces):
+            if (chunk + 1) * self._chunk_columns <= first_col:
+                self._free_surfaces.append(self._chunk_surfaces.pop(chunk))
+                self._dirty_chunks.discard(chunk)
+        if merge_last_col >= first_col:
+            self.__merge_colliders(first_col, merge_last_col, 0, self._rows - 1)
+
+    def snapshot(self) -> tuple:
+        """Returns a copy of the loaded columns, so restore() can bring them back
+        without creating the tiles again
+        """
+        return (self._first_col, self._end_col, bytes(self._kinds), array('i', self._collider_at),
+                tuple(self._colliders), tuple(self._free_colliders), tuple(self._tiles.items()), self.digest)
+
+    def restore(self, snapshot: tuple):
+        # puts back the state of the snapshot, the stateful tiles are reset to their initial state
+        self._first_col, self._end_col, kinds, collider_at, colliders, free_colliders, tiles, self.digest = snapshot
+        self._kinds[:] = kinds
+        self._collider_at[:] = collider_at
+        self._colliders[:] = colliders
+        self._free_colliders[:] = free_colliders
+        self._tiles = dict(tiles)
+        self._active = {}
+        for tile in self._tiles.values():
+            tile.reset()
+            tile.attach(self)
+        self._dirty_chunks.update(self._chunk_surfaces)
+
+    def activate(self, tile: Tile):
+        self._active[tile] = None
+
+    def changed(self, tile: Tile):
+        # adds the new state of the tile to the digest
+        TILE_CHANGE.pack_into(self._change, 0, int(tile.x // TILE_SIZE), int(tile.y // TILE_SIZE), tile.kind, tile.state)
+        self.digest = zlib.crc32(self._change, self.digest)
+
+    def update(self) -> list:
+        """Updates only the active tiles (bouncing or broken blocks). Broken tiles are removed
+        and returned, in a list that is reused by the next update
+        """
+        broken = self._broken
+        broken.clear()
+        if not self._active:
+            return broken
+        for tile in list(self._active):
+            tile.update()
+            if tile.broken:
+                broken.append(tile)
+                self.remove(tile)
+            elif not tile.active:
+                del self._active[tile]
+        return broken
+
+    @property
+    def tiles(self) -> list:
+        # copy of the stateful tiles, so tiles can be removed while iterating it
+        return list(self._tiles.values())
+
+    @property
+    def colliders(self) -> list:
+        return [collider for collider in self._colliders if collider is not None]
+
+    def __mergeable(self, col: int, row: int, first_col: int, last_col: int) -> bool:
+        # True if the cell is a static solid tile inside the columns being merged without a collider yet
+        if col < first_col or col > last_col:
+            return False
+        cell = self.__cell(col, row)
+        return self._kinds[cell] in SOLID_KINDS and not self._collider_at[cell]
+
+    def __merge_colliders(self, first_col: int, last_col: int, first_row: int, last_row: int):
+        """Creates colliders for the static tiles of the given area that don't have one.
+        Every row is split into runs of contiguous solid tiles, and a run is extended to the
+        rows below while they have a run with exactly the same columns
+        """
+        for row in range(first_row, last_row + 1):
+            col = first_col
+            while col <= last_col:
+                cell = self.__cell(col, row)
+                kind = self._kinds[cell]
+                if self._collider_at[cell] or kind == EMPTY or cell in self._tiles:
+                    col += 1
+                elif kind not in SOLID_KINDS:
+                    # static tiles that are not solid (flag) get their own collider
+                    x = col * TILE_SIZE + STATIC_TILE_OFFSETS.get(kind, 0)
+                    self.__add_collider(Tile(x, row * TILE_SIZE, kind=kind), col, col, row, row)
+                    col += 1
+                else:
+                    end_col = col
+                    while self.__mergeable(end_col + 1, row, first_col, last_col):
+                        end_col += 1
+                    end_row = row
+                    while end_row < last_row and self.__same_run(col, end_col, end_row + 1, first_col, last_col):
+                        end_row += 1
+                    collider = Tile(col * TILE_SIZE, row * TILE_SIZE, (end_col - col + 1) * TILE_SIZE,
+                                    (end_row - row + 1) * TILE_SIZE, SOLID)
+                    self.__add_collider(collider, col, end_col, row, end_row)
+                    col = end_col + 1
+
+    def __same_run(self, first_col: int, last_col: int, row: int, area_first_col: int, area_last_col: int) -> bool:
+        # True if the run of solid tiles of the row covers exactly the given columns
+        if self.__mergeable(first_col - 1, row, area_first_col, area_last_col) or \
+                self.__mergeable(last_col + 1, row, area_first_col, area_last_col):
+            return False
+        for col in range(first_col, last_col + 1):
+            if not self.__mergeable(col, row, area_first_col, area_last_col):
+                return False
+        return True
+
+    def __add_collider(self, collider: Tile, first_col: int, last_col: int, first_row: int, last_row: int):
+        if self._free_colliders:
+            index = self._free_colliders.pop()
+            self._colliders[index] = collider
+        else:
+            index = len(self._colliders)
+            self._colliders.append(collider)
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                self._collider_at[self.__cell(col, row)] = index + 1
+
+    def __remove_collider(self, index: int):
+        collider = self._colliders[index]
+        first_col = int(collider.left // TILE_SIZE)
+        first_row = int(collider.top // TILE_SIZE)
+        for col in range(first_col, first_col + -(-collider.width // TILE_SIZE)):
+            for row in range(first_row, first_row + collider.height // TILE_SIZE):
+                self._collider_at[self.__cell(col, row)] = 0
+        self._colliders[index] = None
+        self._free_colliders.append(index)
+
+    def __rebuild_colliders(self, first_col: int, last_col: int, first_row: int, last_row: int):
+        """Rebuilds the colliders of an area that has changed. The colliders of the area
+        and its neighbour cells are removed and the area they covered is merged again
+        """
+        area = [first_col, last_col, first_row, last_row]
+        for col in range(max(first_col - 1, self._first_col), min(last_col + 1, self._end_col - 1) + 1):
+            for row in range(max(first_row - 1, 0), min(last_row + 1, self._rows - 1) + 1):
+                # the corners are not neighbours
+                if (col < first_col or col > last_col) and (row < first_row or row > last_row):
+                    continue
+                index = self._collider_at[self.__cell(col, row)] - 1
+                if index >= 0:
+                    collider = self._colliders[index]
+                    area[0] = min(area[0], int(collider.left // TILE_SIZE))
+                    area[1] = max(area[1], int((collider.right - 1) // TILE_SIZE))
+                    area[2] = min(area[2], int(collider.top // TILE_SIZE))
+                    area[3] = max(area[3], int((collider.bottom - 1) // TILE_SIZE))
+                    self.__remove_collider(index)
+        self.__merge_colliders(*area)
+
+    def query(self, sprite: Sprite) -> list:
+        """Returns the colliders and stateful tiles of the cells covered by the given sprite,
+        ordered by row and column like the level strings. The list is reused by the next query
+        """
+        return self.query_area(sprite.left, sprite.top, sprite.right, sprite.bottom)
+
+    def query_area(self, left, top, right, bottom) -> list:
+        # same as query, for any rectangle. Columns that are not loaded are empty
+        tiles = self._query
+        tiles.clear()
+        first_col = max(int(left // TILE_SIZE), self._first_col)
+        last_col = min(int(right // TILE_SIZE), self._end_col - 1)
+        first_row = max(int(top // TILE_SIZE), 0)
+        last_row = min(int(bottom // TILE_SIZE), self._rows - 1)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                cell = self.__cell(col, row)
+                index = self._collider_at[cell]
+                if index:
+                    collider = self._colliders[index - 1]
+                    # merged colliders cover more than one cell
+                    if collider not in tiles:
+                        tiles.append(collider)
+                elif cell in self._tiles:
+                    tiles.append(self._tiles[cell])
+        return tiles
+
+    def __invalidate_chunks(self, first_col: int, last_col: int):
+        # the chunks of the given columns must be rendered again
+        # tiles with an offset can be drawn over the next chunk, so it is also rendered again
+        for chunk in range(first_col // self._chunk_columns, (last_col + 1) // self._chunk_columns + 1):
+            if chunk in self._chunk_surfaces:
+                self._dirty_chunks.add(chunk)
+
+    def __chunk_surface(self, chunk: int) -> int:
+        # returns the surface of the chunk, rendering it if it is new or has changed
+        surface = self._chunk_surfaces.get(chunk)
+        if surface is not None and chunk not in self._dirty_chunks:
+            return surface
+        if surface is None:
+            if self._free_surfaces:
+                surface = self._free_surfaces.pop()
+            else:
+                surface = pyxel.create_surface(CHUNK_WIDTH, self._rows * TILE_SIZE)
+            self._chunk_surfaces[chunk] = surface
+        self._dirty_chunks.discard(chunk)
+
+        pyxel.set_target(surface)
+        pyxel.cls()
+        chunk_col = chunk * self._chunk_columns
+        # the previous column is also drawn because its tiles may have an offset
+        first_col = max(chunk_col - 1, self._first_col)
+        last_col = min(chunk_col + self._chunk_columns, self._end_col) - 1
+        for row in range(self._rows):
+            for col in range(first_col, last_col + 1):
+                cell = self.__cell(col, row)
+                kind = self._kinds[cell]
+                if kind != EMPTY and cell not in self._tiles:
+                    x = (col - chunk_col) * TILE_SIZE + STATIC_TILE_OFFSETS.get(kind, 0)
+                    STATIC_TILE_IMAGES[kind].draw(x, row * TILE_SIZE)
+        pyxel.set_target(None)
+        return surface
+
+    def draw(self, x_shift: int, first_col: int, last_col: int):
+        # only the given columns are drawn: first the chunks of static tiles, then the stateful tiles by rows
+        first_col = max(first_col, self._first_col)
+        last_col = min(last_col, self._end_col - 1)
+        for chunk in range(first_col // self._chunk_columns, last_col // self._chunk_columns + 1):
+            surface = self.__chunk_surface(chunk)
+            pyxel.blt(chunk * CHUNK_WIDTH + x_shift, 0, surface, 0, 0, CHUNK_WIDTH, self._rows * TILE_SIZE)
+        for row in range(self._rows):
+            for col in range(first_col, last_col + 1):
+                tile = self._tiles.get(self.__cell(col, row))
+                if tile is not None:
+                    tile.draw(x_shift)